@@ -0,0 +1,22 @@
+"""
+Subcommands of viasegura.py, one module each with a run(args) function.
+
+A command module is imported only when its command runs, so it imports the
+libraries it needs at module level; this package and viasegura.py must stay
+stdlib-only (plus src.config).
+"""
+COMMANDS = {
+    'prepare': "Clean, geocode and index the raw dataset",
+    'aggregate': "Weekly H3 aggregation and feature engineering",
+    'train': "Train the LightGBM model on the weekly features",
+    'forecast': "Forecast the next PREDICTION_WEEKS weeks",
+    'export': "Write the backend files (CSV, bundle, Postgres)",
+    'bench': "Measure the cold-start time of every command"
+}
+
+# Artifacts passed between commands, in BACKEND_EXPORT_DIR
+MODEL_FILE = "lgb_model.txt"
+FEATURES_FILE = "features_weekly.pkl"
+TRAINING_FILE = "training.json"
+PREDICTIONS_FILE = "predictions_weekly.pkl"
+PERIOD_PREDICTIONS_FILE = "predictions_weekly_period.pkl"
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.config.config import PROCESSED_DATASET_PATH, BACKEND_EXPORT_DIR
+from src.commands import FEATURES_FILE
+from src.preprocessing.cube import sync_cube
+from src.modeling.features import build_weekly_features
+
+
+def run(args) -> None:
+    print("\n[1/4] Loading processed dataset...")
+    df = pd.read_csv(PROCESSED_DATASET_PATH, low_memory=False)
+    df_features = build_weekly_features(sync_cube(df))
+
+    export_dir = Path(BACKEND_EXPORT_DIR)
+    export_dir.mkdir(exist_ok=True, parents=True)
+    df_features.to_pickle(export_dir / FEATURES_FILE)
+    print(f"  - {len(df_features):,} rows written to {export_dir / FEATURES_FILE}")
@@ -0,0 +1,81 @@
+"""
+Cold-start time of every command: a fresh interpreter runs
+`viasegura.py --cold-start <command>`, which imports the command's module
+and exits, plus `viasegura.py --help`. The median of the repeats is appended
+to COLD_START_LOG with the current commit, so regressions show up as a
+delta against the previous run.
+"""
+import csv
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from src.config.config import PROJECT_ROOT, COLD_START_LOG
+from src.commands import COMMANDS
+
+LOG_FIELDS = ['timestamp', 'commit', 'command', 'median_s', 'min_s']
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def cold_start(argv: list, repeats: int) -> list:
+    """Wall-clock seconds of `python viasegura.py <argv>` in fresh interpreters."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(PROJECT_ROOT / "viasegura.py"), *argv],
+                       cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _last_run(log_path: Path) -> dict:
+    if not log_path.exists():
+        return {}
+    with open(log_path, newline="") as f:
+        return {row['command']: float(row['median_s']) for row in csv.DictReader(f)}
+
+
+def run(args) -> None:
+    log_path = Path(COLD_START_LOG)
+    previous = _last_run(log_path)
+    timestamp, commit = datetime.now().isoformat(timespec='seconds'), _commit()
+
+    rows = []
+    for command in ['--help', *COMMANDS]:
+        argv = [command] if command == '--help' else ['--cold-start', command]
+        times = cold_start(argv, args.repeats)
+        rows.append({
+            'timestamp': timestamp,
+            'commit': commit,
+            'command': command,
+            'median_s': round(statistics.median(times), 4),
+            'min_s': round(min(times), 4)
+        })
+
+    print(f"{'command':<12}{'median_s':>10}{'min_s':>10}{'previous':>10}{'delta':>10}")
+    for row in rows:
+        last = previous.get(row['command'])
+        delta = f"{row['median_s'] - last:+.3f}" if last is not None else "-"
+        last = f"{last:.3f}" if last is not None else "-"
+        print(f"{row['command']:<12}{row['median_s']:>10.3f}{row['min_s']:>10.3f}{last:>10}{delta:>10}")
+
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    new_log = not log_path.exists()
+    with open(log_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
+        if new_log:
+            writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nAppended to {log_path}")
@@ -0,0 +1,21 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from src.config.config import BACKEND_EXPORT_DIR, PERIOD_FORECAST
+from src.commands import FEATURES_FILE, TRAINING_FILE, PREDICTIONS_FILE, PERIOD_PREDICTIONS_FILE
+from src.export.backend import export_backend_files
+
+
+def run(args) -> None:
+    export_dir = Path(BACKEND_EXPORT_DIR)
+    with open(export_dir / TRAINING_FILE) as f:
+        training = json.load(f)
+    feature_cols = training.pop('feature_cols')
+
+    df_features = pd.read_pickle(export_dir / FEATURES_FILE)
+    df_predictions = pd.read_pickle(export_dir / PREDICTIONS_FILE)
+    period_path = export_dir / PERIOD_PREDICTIONS_FILE
+    df_period_predictions = pd.read_pickle(period_path) if PERIOD_FORECAST and period_path.exists() else None
+    export_backend_files(df_features, df_predictions, feature_cols, training, df_period_predictions)
@@ -0,0 +1,44 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from src.config.config import (
+    PROCESSED_DATASET_PATH,
+    BACKEND_EXPORT_DIR,
+    PREDICTION_WEEKS,
+    PERIOD_FORECAST,
+    SHARDED
+)
+from src.commands import MODEL_FILE, FEATURES_FILE, TRAINING_FILE, PREDICTIONS_FILE, PERIOD_PREDICTIONS_FILE
+from src.modeling.forecast import forecast_weeks, load_model
+from src.modeling.sharding import sharded_forecast
+
+
+def run(args) -> None:
+    export_dir = Path(BACKEND_EXPORT_DIR)
+    with open(export_dir / TRAINING_FILE) as f:
+        training = json.load(f)
+
+    df_features = pd.read_pickle(export_dir / FEATURES_FILE)
+
+    print("\n[4/4] Generating predictions...")
+    if SHARDED and training['training_mode'] == 'full':
+        # Shard feature partitions were written by `aggregate`
+        df_predictions = sharded_forecast(export_dir / MODEL_FILE, training['feature_cols'], PREDICTION_WEEKS)
+    else:
+        model = load_model(export_dir / MODEL_FILE)
+        df_predictions = forecast_weeks(model, df_features, training['feature_cols'], PREDICTION_WEEKS)
+
+    df_predictions.to_pickle(export_dir / PREDICTIONS_FILE)
+    print(f"  - {len(df_predictions):,} predictions written to {export_dir / PREDICTIONS_FILE}")
+
+    if PERIOD_FORECAST:
+        # Imports lightgbm: only paid when the time-of-day model is enabled
+        from src.modeling.period_model import train_period_model
+        from src.modeling.training import model_params
+
+        print("\n[EXTRA] Training time-of-day model...")
+        df = pd.read_csv(PROCESSED_DATASET_PATH, low_memory=False)
+        df_period = train_period_model(df, df_features, model_params())['predictions']
+        df_period.to_pickle(export_dir / PERIOD_PREDICTIONS_FILE)
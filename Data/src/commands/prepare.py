@@ -0,0 +1,5 @@
+from prepare_dataset import prepare_processed_dataset
+
+
+def run(args) -> None:
+    prepare_processed_dataset()
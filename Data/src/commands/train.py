@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from src.config.config import (
+    PROCESSED_DATASET_PATH,
+    BACKEND_EXPORT_DIR,
+    INCREMENTAL_UPDATE,
+    RUN_BACKTEST,
+    BACKTEST_WARM_START
+)
+from src.commands import MODEL_FILE, FEATURES_FILE, TRAINING_FILE
+from src.modeling.training import model_params, run_poisson_baseline, fit_model
+from src.preprocessing.cube import sync_cube
+from src.modeling.features import build_weekly_features
+from src.modeling.incremental import incremental_update
+from src.modeling.backtest import run_backtest
+
+
+def run(args) -> None:
+    export_dir = Path(BACKEND_EXPORT_DIR)
+    export_dir.mkdir(exist_ok=True, parents=True)
+    params = model_params()
+
+    cube = None
+    if args.baseline or INCREMENTAL_UPDATE:
+        print("\n[1/4] Loading processed dataset...")
+        cube = sync_cube(pd.read_csv(PROCESSED_DATASET_PATH, low_memory=False))
+    if args.baseline:
+        run_poisson_baseline(cube)
+
+    update = None
+    if INCREMENTAL_UPDATE:
+        print("\n[2/4] Updating previous model with new weeks...")
+        update = incremental_update(cube, export_dir, params)
+        if update is None:
+            print("  -> Falling back to full retrain")
+
+    if update is not None:
+        model = update['model']
+        df_features = update['features']
+        feature_cols = update['feature_cols']
+        training = {
+            'training_mode': 'incremental',
+            'cv_metrics': {'poisson_deviance': update['reference_deviance']}
+        }
+        print(f"\n[3/4] Model updated ({model.num_trees()} trees)")
+        df_features.to_pickle(export_dir / FEATURES_FILE)
+    else:
+        if INCREMENTAL_UPDATE:
+            # New weeks arrived since `aggregate`: rebuild the panel
+            df_features = build_weekly_features(cube)
+            df_features.to_pickle(export_dir / FEATURES_FILE)
+        else:
+            df_features = pd.read_pickle(export_dir / FEATURES_FILE)
+        model, feature_cols, cv_metrics = fit_model(df_features, params)
+        training = {'training_mode': 'full', 'cv_metrics': cv_metrics}
+
+    model.save_model(export_dir / MODEL_FILE)
+    with open(export_dir / TRAINING_FILE, "w") as f:
+        json.dump({**training, 'feature_cols': feature_cols}, f, indent=2)
+
+    if RUN_BACKTEST:
+        print("\n[EXTRA] Backtesting the 12-week forecast...")
+        backtest = run_backtest(df_features, feature_cols, warm_start=BACKTEST_WARM_START)
+        backtest['by_horizon'].to_csv(export_dir / "backtest_by_horizon.csv", index=False)
+        backtest['by_cutoff'].to_csv(export_dir / "backtest_by_cutoff.csv", index=False)
@@ -0,0 +1,107 @@
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.config.config import (
+    BACKEND_EXPORT_DIR,
+    PREDICTION_WEEKS,
+    EXPORT_FORMAT,
+    BUNDLE_KEEP,
+    EXPORT_POSTGRES,
+    EXPORT_EXPLANATIONS
+)
+from src.export.bundle import write_bundle, build_cell_dictionary
+from src.utils import monthly_heatmap
+
+
+def export_backend_files(df_historical, df_predictions, feature_cols, training=None,
+                         df_period_predictions=None, export_format=EXPORT_FORMAT):
+    export_dir = Path(BACKEND_EXPORT_DIR)
+    export_dir.mkdir(exist_ok=True, parents=True)
+
+    h3_meta = df_historical[['h3_cell', 'latitude', 'longitude', 'bairro_clean']].drop_duplicates()
+    monthly = monthly_heatmap(df_historical)
+
+    meta = {
+        "last_updated": pd.Timestamp.now().isoformat(),
+        "h3_resolution": 9,
+        "prediction_weeks": PREDICTION_WEEKS,
+        "model_type": "LightGBM Poisson",
+        "total_h3_cells": len(h3_meta),
+        "features_used": feature_cols
+    }
+    if training:
+        meta.update(training)
+
+    df_explanations = None
+    if EXPORT_EXPLANATIONS:
+        # Imports lightgbm (pred_contrib); explains the model saved in the export directory
+        from src.export.explanations import explain_forecast
+        explained = explain_forecast(export_dir / "lgb_model.txt", df_historical, feature_cols)
+        df_explanations = explained['explanations']
+        meta["explanations"] = {
+            "top_k": int(df_explanations['rank'].max()),
+            "base_value": explained['base_value'],
+            "scale": "log"
+        }
+        print(f"  - Explanations: {len(df_explanations):,} contributions in {explained['seconds']:.2f}s "
+              f"({explained['weeks_cached']} of {PREDICTION_WEEKS} weeks cached)")
+
+    if export_format in ('csv', 'both'):
+        start = time.perf_counter()
+        files = ["h3_grid.csv", "predictions_weekly.csv", "heatmap_monthly.csv"]
+
+        # 1. H3 grid metadata
+        h3_meta.to_csv(export_dir / "h3_grid.csv", index=False)
+
+        # 2. Weekly predictions
+        df_predictions.to_csv(export_dir / "predictions_weekly.csv", index=False)
+        if df_period_predictions is not None:
+            df_period_predictions.to_csv(export_dir / "predictions_weekly_period.csv", index=False)
+            files.append("predictions_weekly_period.csv")
+        if df_explanations is not None:
+            df_explanations.to_csv(export_dir / "explanations_weekly.csv", index=False)
+            files.append("explanations_weekly.csv")
+
+        # 3. Monthly heatmap (historical)
+        monthly.to_csv(export_dir / "heatmap_monthly.csv", index=False)
+
+        csv_seconds = time.perf_counter() - start
+        csv_bytes = sum((export_dir / f).stat().st_size for f in files)
+
+    if export_format in ('bundle', 'both'):
+        bundle = write_bundle(
+            export_dir / "bundles",
+            build_cell_dictionary(df_historical),
+            df_predictions,
+            monthly,
+            meta,
+            df_period_predictions=df_period_predictions,
+            df_explanations=df_explanations,
+            keep=BUNDLE_KEEP
+        )
+        meta["bundle_version"] = bundle['version']
+        print(f"  - Bundle {bundle['version']}: {bundle['bytes'] / 1e6:.2f} MB in {bundle['seconds']:.2f}s")
+
+    if export_format == 'both':
+        print(f"  - CSV export: {csv_bytes / 1e6:.2f} MB in {csv_seconds:.2f}s")
+        print(f"  - Bundle vs CSV: {bundle['bytes'] / csv_bytes:.1%} of the size, "
+              f"{bundle['seconds'] / csv_seconds:.1%} of the write time")
+
+    if EXPORT_POSTGRES:
+        # Optional dependency (psycopg), only needed for this export
+        from src.export.postgres import load_to_postgres
+        print("  - Loading forecasts into Postgres...")
+        load_to_postgres({
+            'cells': build_cell_dictionary(df_historical),
+            'predictions_weekly': df_predictions,
+            'heatmap_monthly': monthly
+        })
+
+    # 4. Metadata
+    with open(export_dir / "metadata.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"\n Exported backend files to: {export_dir}")
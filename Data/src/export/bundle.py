@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import h3
+import numpy as np
+import pandas as pd
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_table(path: Path, arrays: dict) -> dict:
+    np.savez_compressed(path, **arrays)
+    return {
+        "sha256": _sha256(path),
+        "bytes": path.stat().st_size,
+        "rows": len(next(iter(arrays.values()))),
+        "columns": {name: str(a.dtype) for name, a in arrays.items()}
+    }
+
+
+def build_cell_dictionary(df_historical: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per H3 cell: the uint64 H3 index, mean coordinates and bairro.
+    The row position is the cell id used by every other table of the bundle.
+    """
+    cells = df_historical.groupby('h3_cell', sort=True).agg(
+        latitude=('latitude', 'mean'),
+        longitude=('longitude', 'mean'),
+        bairro=('bairro_clean', 'first')
+    ).reset_index()
+    cells['h3'] = np.array([h3.str_to_int(c) for c in cells['h3_cell']], dtype=np.uint64)
+    return cells
+
+
+def _prediction_arrays(df: pd.DataFrame, cell_ids: pd.Series, extra_keys: tuple = ()) -> dict:
+    df = df.assign(cell_id=df['h3_cell'].map(cell_ids)).dropna(subset=['cell_id'])
+    df = df.sort_values(['cell_id', 'week_start', *extra_keys])
+    arrays = {
+        'cell_id': df['cell_id'].to_numpy(dtype=np.int32),
+        'week_start': df['week_start'].to_numpy().astype('datetime64[D]'),
+        'predicted_accidents': df['predicted_accidents'].to_numpy(dtype=np.float32)
+    }
+    for key in extra_keys:
+        arrays[key] = df[key].to_numpy(dtype=np.int8)
+    return arrays
+
+
+def write_bundle(
+    bundle_root: Path,
+    df_cells: pd.DataFrame,
+    df_predictions: pd.DataFrame,
+    df_heatmap: pd.DataFrame,
+    metadata: dict,
+    df_period_predictions: Optional[pd.DataFrame] = None,
+    df_explanations: Optional[pd.DataFrame] = None,
+    keep: int = 3
+) -> dict:
+    """
+    Write a versioned binary export bundle and make it the current one.
+
+    Layout of bundle_root:
+        CURRENT                  # Name of the bundle in use
+        <version>/
+            manifest.json        # Format version, metadata, checksums
+            cells.npz            # Cell dictionary (h3 as uint64, lat/lon, bairro code)
+            predictions.npz      # cell_id, week_start, predicted_accidents
+            heatmap_monthly.npz  # cell_id, year, month, num_sinistros
+            predictions_period.npz  # Optional, adds period_code
+            explanations.npz     # Optional, cell_id, week_start, rank, feature_code, contribution
+
+    Tables are compressed columnar arrays keyed by cell id (the row of the
+    cell dictionary), written in parallel into a temporary directory. The
+    directory is renamed into place once the manifest is written, and CURRENT
+    is then replaced atomically, so readers never see a partial bundle and
+    can swap to the new one by re-reading CURRENT. Only the `keep` most
+    recent bundles are kept.
+
+    Returns:
+        Dict with 'version', 'path', 'bytes' and 'seconds'
+    """
+    start = time.perf_counter()
+    bundle_root = Path(bundle_root)
+    bundle_root.mkdir(exist_ok=True, parents=True)
+
+    version = pd.Timestamp.now().strftime("%Y%m%dT%H%M%S%f")
+    tmp_dir = bundle_root / f".tmp-{version}"
+    tmp_dir.mkdir()
+
+    cell_ids = pd.Series(np.arange(len(df_cells), dtype=np.int32), index=df_cells['h3_cell'])
+    bairro_codes, bairros = pd.factorize(df_cells['bairro'].fillna(''))
+
+    tables = {
+        'cells': {
+            'h3': df_cells['h3'].to_numpy(dtype=np.uint64),
+            'latitude': df_cells['latitude'].to_numpy(dtype=np.float64),
+            'longitude': df_cells['longitude'].to_numpy(dtype=np.float64),
+            'bairro_code': bairro_codes.astype(np.int32),
+            'bairros': np.asarray(bairros, dtype=str)
+        },
+        'predictions': _prediction_arrays(df_predictions, cell_ids),
+        'heatmap_monthly': {
+            'cell_id': df_heatmap['h3_cell'].map(cell_ids).to_numpy(dtype=np.int32),
+            'year': df_heatmap['year'].to_numpy(dtype=np.int16),
+            'month': df_heatmap['month'].to_numpy(dtype=np.int8),
+            'num_sinistros': np.rint(df_heatmap['num_sinistros'].to_numpy()).astype(np.int32)
+        }
+    }
+    if df_period_predictions is not None:
+        periods = sorted(df_period_predictions['period'].unique())
+        df_period = df_period_predictions.assign(
+            period_code=df_period_predictions['period'].map({p: i for i, p in enumerate(periods)})
+        )
+        tables['predictions_period'] = _prediction_arrays(df_period, cell_ids, ('period_code',))
+        metadata = {**metadata, 'periods': periods}
+    if df_explanations is not None:
+        df_expl = df_explanations.assign(cell_id=df_explanations['h3_cell'].map(cell_ids)).dropna(subset=['cell_id'])
+        df_expl = df_expl.sort_values(['cell_id', 'week_start', 'rank'])
+        tables['explanations'] = {
+            'cell_id': df_expl['cell_id'].to_numpy(dtype=np.int32),
+            'week_start': df_expl['week_start'].to_numpy().astype('datetime64[D]'),
+            'rank': df_expl['rank'].to_numpy(dtype=np.int8),
+            'feature_code': df_expl['feature'].cat.codes.to_numpy(dtype=np.int16),
+            'contribution': df_expl['contribution'].to_numpy(dtype=np.float32)
+        }
+        metadata = {**metadata, 'explanation_features': list(df_explanations['feature'].cat.categories)}
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+            futures = {
+                name: pool.submit(_write_table, tmp_dir / f"{name}.npz", arrays)
+                for name, arrays in tables.items()
+            }
+            files = {f"{name}.npz": future.result() for name, future in futures.items()}
+
+        manifest = {
+            "format_version": BUNDLE_FORMAT_VERSION,
+            "version": version,
+            "created_at": pd.Timestamp.now().isoformat(),
+            "files": files,
+            "metadata": metadata
+        }
+        with open(tmp_dir / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        os.replace(tmp_dir, bundle_root / version)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    pointer = bundle_root / f".{CURRENT_FILE}-{version}"
+    pointer.write_text(version)
+    os.replace(pointer, bundle_root / CURRENT_FILE)
+
+    versions = sorted(p.name for p in bundle_root.iterdir() if p.is_dir() and not p.name.startswith('.'))
+    for old in versions[:-keep] if keep else []:
+        shutil.rmtree(bundle_root / old, ignore_errors=True)
+
+    return {
+        'version': version,
+        'path': bundle_root / version,
+        'bytes': sum(f['bytes'] for f in files.values()),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def read_bundle(bundle_root: Path, version: Optional[str] = None, verify: bool = True) -> dict:
+    """
+    Load a bundle written by write_bundle (the CURRENT one by default).
+
+    With verify, every table's checksum is checked against the manifest and a
+    ValueError is raised on mismatch.
+
+    Returns:
+        Dict with 'manifest' and one dict of arrays per table
+    """
+    bundle_root = Path(bundle_root)
+    version = version or (bundle_root / CURRENT_FILE).read_text().strip()
+    bundle_dir = bundle_root / version
+
+    with open(bundle_dir / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format: {manifest['format_version']}")
+
+    bundle = {'manifest': manifest}
+    for name, info in manifest["files"].items():
+        path = bundle_dir / name
+        if verify and _sha256(path) != info["sha256"]:
+            raise ValueError(f"Checksum mismatch for {path}")
+        with np.load(path) as data:
+            bundle[name.removesuffix('.npz')] = {key: data[key] for key in data.files}
+    return bundle
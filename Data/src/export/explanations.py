@@ -0,0 +1,111 @@
+"""
+Top-k feature contributions of the weekly forecasts (LightGBM pred_contrib).
+
+The feature matrix of every forecast week is rebuilt with iter_forecast_weeks
+(the same features forecast_weeks used) and explained for all cells in
+one pred_contrib call over its distinct rows. Only the k contributions of largest magnitude per cell
+and week are kept. Contributions are on the model's raw (log) scale:
+base_value plus all of a row's contributions is log(predicted_accidents).
+
+Each week's top-k arrays are cached in <export_dir>/explanations_cache/<model
+hash>/<feature matrix hash>.npz, so an export with the same model and an
+unchanged week does not call pred_contrib again. Caches of other models are
+deleted.
+"""
+import hashlib
+import shutil
+import time
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.config.config import PREDICTION_WEEKS, EXPLANATION_TOP_K
+from src.modeling.forecast import iter_forecast_weeks
+
+CACHE_DIR = "explanations_cache"
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def top_contributions(contrib: np.ndarray, k: int) -> tuple:
+    """
+    The k largest contributions by magnitude of each row of a pred_contrib
+    matrix (last column, the base value, excluded), in decreasing magnitude.
+
+    Returns:
+        (feature indices int16, contributions float32), both of shape (rows, k)
+    """
+    contrib = contrib[:, :-1]
+    k = min(k, contrib.shape[1])
+    magnitude = np.abs(contrib)
+    idx = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(magnitude, idx, axis=1), axis=1, kind='stable')
+    idx = np.take_along_axis(idx, order, axis=1)
+    return idx.astype(np.int16), np.take_along_axis(contrib, idx, axis=1).astype(np.float32)
+
+
+def explain_forecast(
+    model_path: Path,
+    df_historical: pd.DataFrame,
+    feature_cols: list,
+    n_weeks: int = PREDICTION_WEEKS,
+    top_k: int = EXPLANATION_TOP_K
+) -> dict:
+    """
+    Top-k contributions of every cell's forecast for the next n_weeks.
+
+    Returns:
+        Dict with 'explanations' (h3_cell, week_start, rank, feature,
+        contribution; one row per cell, week and rank), 'base_value',
+        'weeks_cached' (weeks read from the cache) and 'seconds'
+    """
+    start = time.perf_counter()
+    model_path = Path(model_path)
+    model_hash = _digest(model_path.read_bytes())
+    cache_root = model_path.parent / CACHE_DIR
+    cache_dir = cache_root / model_hash
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for old in cache_root.iterdir():
+        if old != cache_dir:
+            shutil.rmtree(old, ignore_errors=True)
+
+    booster = lgb.Booster(model_file=str(model_path))
+    base_value, weeks_cached, frames = None, 0, []
+    for week_start, units, X, _ in iter_forecast_weeks(booster, df_historical, feature_cols, n_weeks):
+        matrix = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+        path = cache_dir / f"{_digest(matrix.tobytes() + ','.join(feature_cols).encode())}-k{top_k}.npz"
+        if path.exists():
+            with np.load(path) as cached:
+                idx, values, base_value = cached['feature'], cached['contribution'], float(cached['base_value'])
+            weeks_cached += 1
+        else:
+            # Cells with identical features (e.g. no recent accidents in the same bairro) are explained once
+            unique_rows, inverse = np.unique(matrix, axis=0, return_inverse=True)
+            contrib = booster.predict(unique_rows, pred_contrib=True)
+            idx, values = top_contributions(contrib, top_k)
+            idx, values = idx[inverse.ravel()], values[inverse.ravel()]
+            base_value = float(contrib[0, -1])
+            tmp = path.with_name(f".{path.name}")
+            with open(tmp, "wb") as f:
+                np.savez(f, feature=idx, contribution=values, base_value=base_value)
+            tmp.replace(path)
+
+        n_rows, k = idx.shape
+        frames.append(pd.DataFrame({
+            'h3_cell': np.repeat(units['h3_cell'].to_numpy(), k),
+            'week_start': week_start,
+            'rank': np.tile(np.arange(1, k + 1, dtype=np.int8), n_rows),
+            'feature': pd.Categorical.from_codes(idx.ravel(), categories=feature_cols),
+            'contribution': values.ravel()
+        }))
+
+    return {
+        'explanations': pd.concat(frames, ignore_index=True),
+        'base_value': base_value,
+        'weeks_cached': weeks_cached,
+        'seconds': time.perf_counter() - start
+    }
@@ -0,0 +1,248 @@
+"""
+Bulk load of the forecast artifacts into Postgres.
+
+    python -m src.export.postgres [--export-dir backend_export] [--dsn postgresql://...]
+
+Each table is streamed in chunks into a fresh staging table with COPY FROM
+STDIN, indexed after the load, and all staging tables then replace the live
+ones in a single transaction, so readers see either the old or the new
+forecasts, never a mix.
+"""
+import argparse
+import io
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+import h3
+import numpy as np
+import pandas as pd
+import psycopg
+from psycopg import sql
+from psycopg_pool import ConnectionPool
+
+from src.config.config import (
+    BACKEND_EXPORT_DIR,
+    POSTGRES_DSN,
+    POSTGRES_SCHEMA,
+    COPY_FORMAT,
+    COPY_CHUNK_ROWS
+)
+
+Source = Union[pd.DataFrame, Path, str, Iterable[pd.DataFrame]]
+
+
+def _prepare_cells(chunk: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        'h3_cell': chunk['h3_cell'],
+        'h3': [h3.str_to_int(c) for c in chunk['h3_cell']],
+        'latitude': chunk['latitude'],
+        'longitude': chunk['longitude'],
+        'bairro': chunk['bairro'] if 'bairro' in chunk.columns else chunk['bairro_clean']
+    })
+
+
+def _prepare_predictions(chunk: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        'h3_cell': chunk['h3_cell'],
+        'week_start': pd.to_datetime(chunk['week_start']).dt.date,
+        'predicted_accidents': chunk['predicted_accidents']
+    })
+
+
+def _prepare_heatmap(chunk: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        'h3_cell': chunk['h3_cell'],
+        'year': chunk['year'].astype(int),
+        'month': chunk['month'].astype(int),
+        'num_sinistros': np.rint(chunk['num_sinistros']).astype(int)
+    })
+
+
+# Table name -> columns, indexes built after the load, chunk preparation
+TABLES = {
+    'cells': {
+        'columns': [
+            ('h3_cell', 'text'), ('h3', 'bigint'), ('latitude', 'double precision'),
+            ('longitude', 'double precision'), ('bairro', 'text')
+        ],
+        'indexes': [('h3_cell',), ('bairro',)],
+        'unique': ('h3_cell',),
+        'prepare': _prepare_cells
+    },
+    'predictions_weekly': {
+        'columns': [('h3_cell', 'text'), ('week_start', 'date'), ('predicted_accidents', 'double precision')],
+        'indexes': [('h3_cell', 'week_start'), ('week_start',)],
+        'unique': ('h3_cell', 'week_start'),
+        'prepare': _prepare_predictions
+    },
+    'heatmap_monthly': {
+        'columns': [('h3_cell', 'text'), ('year', 'smallint'), ('month', 'smallint'), ('num_sinistros', 'integer')],
+        'indexes': [('h3_cell', 'year', 'month'), ('year', 'month')],
+        'unique': ('h3_cell', 'year', 'month'),
+        'prepare': _prepare_heatmap
+    }
+}
+
+
+def _chunks(source: Source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield a source in chunks: DataFrame slices, CSV read in chunks, or chunks as given."""
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    elif isinstance(source, (str, Path)):
+        yield from pd.read_csv(source, chunksize=chunk_rows)
+    else:
+        yield from source
+
+
+def _index_name(table: str, columns: tuple) -> str:
+    return f"{table}_{'_'.join(columns)}_idx"
+
+
+def _copy_chunk(copy, chunk: pd.DataFrame, columns: list, copy_format: str) -> None:
+    if copy_format == 'binary':
+        # NaN / NA become None (NULL), as empty fields do in the CSV format
+        values = chunk[columns].astype(object)
+        for row in values.where(values.notna(), None).itertuples(index=False, name=None):
+            copy.write_row(row)
+    else:
+        buffer = io.StringIO()
+        chunk[columns].to_csv(buffer, header=False, index=False)
+        copy.write(buffer.getvalue())
+
+
+def _load_table(pool: ConnectionPool, schema: str, table: str, staging: str, source: Source,
+                copy_format: str, chunk_rows: int) -> dict:
+    spec = TABLES[table]
+    columns = [name for name, _ in spec['columns']]
+    start = time.perf_counter()
+    rows = 0
+
+    with pool.connection() as conn:
+        staging_id = sql.Identifier(schema, staging)
+        conn.execute(sql.SQL("CREATE TABLE {} ({})").format(
+            staging_id,
+            sql.SQL(', ').join(sql.SQL("{} {}").format(sql.Identifier(n), sql.SQL(t)) for n, t in spec['columns'])
+        ))
+
+        options = sql.SQL("FORMAT BINARY") if copy_format == 'binary' else sql.SQL("FORMAT CSV")
+        with conn.cursor() as cur:
+            with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN ({})").format(
+                staging_id, sql.SQL(', ').join(map(sql.Identifier, columns)), options
+            )) as copy:
+                if copy_format == 'binary':
+                    copy.set_types([t for _, t in spec['columns']])
+                for chunk in _chunks(source, chunk_rows):
+                    chunk = spec['prepare'](chunk)
+                    _copy_chunk(copy, chunk, columns, copy_format)
+                    rows += len(chunk)
+        load_seconds = time.perf_counter() - start
+
+        # Indexes are built once on the loaded data instead of maintained row by row
+        for index_columns in spec['indexes']:
+            unique = sql.SQL("UNIQUE ") if index_columns == spec['unique'] else sql.SQL("")
+            conn.execute(sql.SQL("CREATE {}INDEX {} ON {} ({})").format(
+                unique,
+                sql.Identifier(_index_name(staging, index_columns)),
+                staging_id,
+                sql.SQL(', ').join(map(sql.Identifier, index_columns))
+            ))
+        conn.execute(sql.SQL("ANALYZE {}").format(staging_id))
+
+    return {'table': table, 'rows': rows, 'load_seconds': load_seconds, 'seconds': time.perf_counter() - start}
+
+
+def _swap(conn: psycopg.Connection, schema: str, staging_names: dict) -> None:
+    with conn.transaction():
+        for table, staging in staging_names.items():
+            conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(schema, table)))
+            conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(schema, staging), sql.Identifier(table)
+            ))
+            for index_columns in TABLES[table]['indexes']:
+                conn.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                    sql.Identifier(schema, _index_name(staging, index_columns)),
+                    sql.Identifier(_index_name(table, index_columns))
+                ))
+
+
+def load_to_postgres(
+    sources: dict,
+    dsn: str = POSTGRES_DSN,
+    schema: str = POSTGRES_SCHEMA,
+    copy_format: str = COPY_FORMAT,
+    chunk_rows: int = COPY_CHUNK_ROWS
+) -> list:
+    """
+    Replace the forecast tables in Postgres with new data.
+
+    Args:
+        sources: Table name (see TABLES) -> DataFrame, CSV path or iterable of
+            DataFrame chunks. Only one chunk per table is in memory at a time
+            (beyond what a DataFrame source already holds).
+        dsn: Postgres connection string
+        schema: Schema of the forecast tables (created if missing)
+        copy_format: 'csv' or 'binary' COPY format
+        chunk_rows: Rows per chunk streamed to COPY
+
+    Returns:
+        List of per-table dicts with rows loaded and timings
+    """
+    unknown = set(sources) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+    suffix = uuid.uuid4().hex[:8]
+    staging_names = {table: f"{table}_staging_{suffix}" for table in sources}
+
+    with ConnectionPool(dsn, min_size=1, max_size=len(sources) + 1, open=True) as pool:
+        with pool.connection() as conn:
+            conn.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema)))
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                futures = [
+                    executor.submit(_load_table, pool, schema, table, staging_names[table], source, copy_format, chunk_rows)
+                    for table, source in sources.items()
+                ]
+                stats = [future.result() for future in futures]
+
+            with pool.connection() as conn:
+                _swap(conn, schema, staging_names)
+        except BaseException:
+            with pool.connection() as conn:
+                for staging in staging_names.values():
+                    conn.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(schema, staging)))
+            raise
+
+    for s in stats:
+        print(f"  - {schema}.{s['table']}: {s['rows']:,} rows (COPY {s['load_seconds']:.2f}s, total {s['seconds']:.2f}s)")
+    return stats
+
+
+def load_export_dir(export_dir: Path = BACKEND_EXPORT_DIR, **kwargs) -> list:
+    """Stream the CSV files of an export directory into Postgres."""
+    export_dir = Path(export_dir)
+    cells = pd.read_csv(export_dir / "h3_grid.csv").drop_duplicates('h3_cell')
+    return load_to_postgres({
+        'cells': cells,
+        'predictions_weekly': export_dir / "predictions_weekly.csv",
+        'heatmap_monthly': export_dir / "heatmap_monthly.csv"
+    }, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a backend export into Postgres")
+    parser.add_argument("--export-dir", default=str(BACKEND_EXPORT_DIR))
+    parser.add_argument("--dsn", default=POSTGRES_DSN)
+    parser.add_argument("--schema", default=POSTGRES_SCHEMA)
+    parser.add_argument("--format", choices=['csv', 'binary'], default=COPY_FORMAT)
+    parser.add_argument("--chunk-rows", type=int, default=COPY_CHUNK_ROWS)
+    args = parser.parse_args()
+    load_export_dir(
+        args.export_dir, dsn=args.dsn, schema=args.schema,
+        copy_format=args.format, chunk_rows=args.chunk_rows
+    )
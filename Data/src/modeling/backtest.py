@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.config.config import (
+    MODEL_CONFIG,
+    N_BOOST_ROUNDS,
+    PREDICTION_WEEKS,
+    BACKTEST_CUTOFFS,
+    BACKTEST_MIN_TRAIN_WEEKS,
+    BACKTEST_WORKERS,
+    BACKTEST_WARM_START_ROUNDS
+)
+from src.modeling.forecast import forecast_weeks, VEHICLE_TYPES
+from src.modeling.lgb_model import poisson_deviance
+
+# Shared state of each worker process, set once by _init_worker
+_shared = {}
+
+
+def select_cutoffs(weeks: np.ndarray, n_cutoffs: int, n_weeks: int, min_train_weeks: int) -> np.ndarray:
+    """
+    Pick up to n_cutoffs evenly spaced week indexes such that every cutoff has
+    at least min_train_weeks of history before it and n_weeks of consecutive
+    actuals after it (cutoffs whose horizon crosses the removed pandemic years
+    are skipped).
+    """
+    weeks = pd.to_datetime(weeks)
+    candidates = np.arange(max(min_train_weeks, 1), len(weeks) - n_weeks + 1)
+    span = weeks[candidates + n_weeks - 1] - weeks[candidates - 1]
+    candidates = candidates[span == pd.Timedelta(weeks=n_weeks)]
+    if len(candidates) == 0:
+        raise ValueError(
+            f"Not enough weeks for backtesting: {len(weeks)} available, "
+            f"{min_train_weeks + n_weeks} consecutive required."
+        )
+    picks = np.linspace(0, len(candidates) - 1, num=min(n_cutoffs, len(candidates))).round().astype(int)
+    return candidates[np.unique(picks)]
+
+
+def _init_worker(X, y, history, actuals, week_bounds, feature_cols, params, n_weeks, init_model):
+    _shared.update(
+        X=X, y=y, history=history, actuals=actuals, week_bounds=week_bounds,
+        feature_cols=feature_cols, params=params, n_weeks=n_weeks,
+        init_model=lgb.Booster(model_str=init_model) if init_model else None
+    )
+
+
+def _run_cutoff(cutoff_idx: int) -> pd.DataFrame:
+    s = _shared
+    bound = s['week_bounds'][cutoff_idx]
+
+    # Rows are sorted by week, so the training set is a prefix of the shared matrix
+    train_data = lgb.Dataset(s['X'][:bound], label=s['y'][:bound], feature_name=s['feature_cols'])
+    if s['init_model'] is not None:
+        model = lgb.train(
+            s['params'], train_data,
+            num_boost_round=BACKTEST_WARM_START_ROUNDS,
+            init_model=s['init_model']
+        )
+    else:
+        model = lgb.train(s['params'], train_data, num_boost_round=N_BOOST_ROUNDS)
+
+    forecast = forecast_weeks(model, s['history'].iloc[:bound], s['feature_cols'], s['n_weeks'])
+
+    horizon_end = s['week_bounds'][cutoff_idx + s['n_weeks']]
+    actuals = s['actuals'].iloc[bound:horizon_end]
+    scored = forecast.merge(actuals, on=['h3_cell', 'week_start'], how='inner')
+
+    last_week = s['history']['week_start'].iloc[bound - 1]
+    scored['horizon'] = (scored['week_start'] - last_week).dt.days // 7
+
+    rows = []
+    for horizon, g in scored.groupby('horizon'):
+        y_true = g['num_sinistros'].to_numpy(dtype=float)
+        y_pred = g['predicted_accidents'].to_numpy(dtype=float)
+        rows.append({
+            'cutoff': last_week + pd.Timedelta(weeks=1),
+            'horizon': int(horizon),
+            'n': len(g),
+            'abs_error_sum': np.abs(y_true - y_pred).sum(),
+            'deviance_sum': poisson_deviance(y_true, y_pred) * len(g)
+        })
+    return pd.DataFrame(rows)
+
+
+def run_backtest(
+    df_features: pd.DataFrame,
+    feature_cols: list,
+    n_cutoffs: int = BACKTEST_CUTOFFS,
+    n_weeks: int = PREDICTION_WEEKS,
+    min_train_weeks: int = BACKTEST_MIN_TRAIN_WEEKS,
+    n_workers: int = BACKTEST_WORKERS,
+    warm_start: bool = False
+) -> dict:
+    """
+    Rolling-origin backtest of the autoregressive weekly forecast.
+
+    For each cutoff week, a model is trained on all rows before the cutoff and
+    the forecast is rolled n_weeks ahead from the history available at the
+    cutoff, then scored against the actual counts by horizon. Historical
+    features only look backwards, so they are computed once on the full panel
+    and every cutoff trains on a prefix of the same week-sorted matrix.
+
+    Cutoffs run in parallel worker processes, each receiving the shared
+    matrices once at start-up. With warm_start, a base model is trained once on
+    the data before the earliest cutoff and each cutoff only continues boosting
+    it for BACKTEST_WARM_START_ROUNDS rounds.
+
+    Args:
+        df_features: Weekly panel with historical and cyclic features
+        feature_cols: Feature columns used by the model
+        n_cutoffs: Number of cutoff weeks to evaluate
+        n_weeks: Forecast horizon in weeks
+        min_train_weeks: Minimum number of weeks of history before a cutoff
+        n_workers: Worker processes (None = all cores)
+        warm_start: Continue boosting a shared base model instead of retraining
+
+    Returns:
+        Dict with 'by_horizon' (MAE and Poisson deviance per horizon, pooled
+        over cutoffs) and 'by_cutoff' (the same metrics per cutoff)
+    """
+    print("ROLLING-ORIGIN BACKTEST")
+
+    df = df_features.sort_values(['week_start', 'h3_cell'], kind='stable').reset_index(drop=True)
+    weeks = df['week_start'].unique()
+    week_bounds = np.searchsorted(df['week_start'].to_numpy(), weeks, side='left')
+    week_bounds = np.append(week_bounds, len(df))
+
+    cutoffs = select_cutoffs(weeks, n_cutoffs, n_weeks, min_train_weeks)
+    n_workers = n_workers or os.cpu_count() or 1
+    n_workers = min(n_workers, len(cutoffs))
+
+    print(f"  - Cutoffs: {len(cutoffs)} ({pd.Timestamp(weeks[cutoffs[0]]).date()} to {pd.Timestamp(weeks[cutoffs[-1]]).date()})")
+    print(f"  - Horizon: {n_weeks} weeks")
+    print(f"  - Workers: {n_workers}")
+
+    X = df[feature_cols].to_numpy(dtype=np.float64)
+    y = df['num_sinistros'].to_numpy(dtype=np.float64)
+    history_cols = ['h3_cell', 'week_start', 'num_sinistros', 'bairro_encoded'] + [
+        f'{v}_historical' for v in VEHICLE_TYPES
+    ]
+    history = df[[c for c in history_cols if c in df.columns]]
+    actuals = df[['h3_cell', 'week_start', 'num_sinistros']]
+
+    # Split cores between workers instead of letting every LightGBM use all of them
+    params = MODEL_CONFIG.copy()
+    params.update({'device': 'cpu', 'num_threads': max(1, (os.cpu_count() or 1) // n_workers)})
+
+    init_model = None
+    if warm_start:
+        bound = week_bounds[cutoffs[0]]
+        print(f"  - Warm start: base model on {bound:,} rows before the first cutoff")
+        base = lgb.train(params, lgb.Dataset(X[:bound], label=y[:bound], feature_name=feature_cols),
+                         num_boost_round=N_BOOST_ROUNDS)
+        init_model = base.model_to_string()
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_worker,
+        initargs=(X, y, history, actuals, week_bounds, feature_cols, params, n_weeks, init_model)
+    ) as pool:
+        futures = [pool.submit(_run_cutoff, int(c)) for c in cutoffs]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            print(f"    → Progress: {done}/{len(cutoffs)} cutoffs", end="\r")
+    print()
+
+    raw = pd.concat(results, ignore_index=True).sort_values(['cutoff', 'horizon'])
+
+    by_cutoff = raw.assign(
+        mae=raw['abs_error_sum'] / raw['n'],
+        poisson_deviance=raw['deviance_sum'] / raw['n']
+    )[['cutoff', 'horizon', 'n', 'mae', 'poisson_deviance']].reset_index(drop=True)
+
+    pooled = raw.groupby('horizon')[['n', 'abs_error_sum', 'deviance_sum']].sum()
+    by_horizon = pd.DataFrame({
+        'horizon': pooled.index,
+        'n': pooled['n'].to_numpy(),
+        'mae': (pooled['abs_error_sum'] / pooled['n']).to_numpy(),
+        'poisson_deviance': (pooled['deviance_sum'] / pooled['n']).to_numpy(),
+        'cutoffs': raw.groupby('horizon')['cutoff'].nunique().to_numpy()
+    })
+
+    for r in by_horizon.itertuples():
+        print(f"  h={r.horizon:>2}: MAE={r.mae:.4f}, Poisson Deviance={r.poisson_deviance:.4f}")
+
+    return {'by_horizon': by_horizon, 'by_cutoff': by_cutoff}
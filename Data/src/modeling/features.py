@@ -0,0 +1,18 @@
+import pandas as pd
+
+from src.config.config import PANDEMIC_YEARS, SHARDED
+from src.preprocessing.cube import AggregateCube
+from src.utils import add_historical_features, add_cyclic_features
+from src.modeling.sharding import sharded_features
+
+
+def build_weekly_features(cube: AggregateCube) -> pd.DataFrame:
+    """
+    Weekly aggregation by H3 cell and feature engineering: the panel the
+    LightGBM model is trained and forecast on.
+    """
+    print("\n[2/4] Aggregating by week and H3 cell...")
+    df_weekly = cube.weekly_panel(PANDEMIC_YEARS)
+
+    df_features = sharded_features(df_weekly) if SHARDED else add_historical_features(df_weekly)
+    return add_cyclic_features(df_features, inplace=True)
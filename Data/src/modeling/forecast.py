@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+from src.config.config import COMPILED_INFERENCE
+from src.preprocessing.calendar_features import week_calendar
+
+VEHICLE_TYPES = ['auto', 'moto', 'onibus', 'caminhao']
+WINDOW_WEEKS = 12
+
+
+def load_model(model_path):
+    """
+    Model saved at model_path, for prediction: the NumPy-compiled ensemble with
+    COMPILED_INFERENCE (no lightgbm import), a lightgbm Booster otherwise.
+    """
+    if COMPILED_INFERENCE:
+        from src.modeling.tree_compiler import CompiledModel
+        return CompiledModel.from_file(model_path)
+    import lightgbm as lgb
+    return lgb.Booster(model_file=str(model_path))
+
+
+def _series_state(df_historical: pd.DataFrame, series: np.ndarray, n_series: int, static_cols: list) -> dict:
+    """
+    Collapse each series' history into the state the autoregressive loop needs:
+    the last 12 weekly counts (right-aligned, NaN-padded), the number of
+    observed weeks, the running total and the last known static columns.
+    `series` holds the integer series id of every row of df_historical.
+    """
+    df = df_historical.assign(_series=series).sort_values(['_series', 'week_start'])
+    grouped = df.groupby('_series', sort=True)
+
+    counts = grouped.size().to_numpy(dtype=float)
+    totals = grouped['num_sinistros'].sum().to_numpy(dtype=float)
+    last = grouped.tail(1)
+
+    tail = grouped.tail(WINDOW_WEEKS)
+    offset = tail.groupby('_series', sort=False).cumcount(ascending=False).to_numpy()
+    window = np.full((n_series, WINDOW_WEEKS), np.nan)
+    window[tail['_series'].to_numpy(), WINDOW_WEEKS - 1 - offset] = tail['num_sinistros'].to_numpy(dtype=float)
+
+    static = {}
+    for v in VEHICLE_TYPES:
+        col = f'{v}_historical'
+        static[col] = last[col].to_numpy(dtype=float) if col in last.columns else np.zeros(n_series)
+    for col in static_cols:
+        static[col] = last[col].to_numpy() if col in last.columns else np.zeros(n_series)
+
+    return {'window': window, 'counts': counts, 'totals': totals, 'static': static}
+
+
+def calendar_row(week_start: pd.Timestamp) -> dict:
+    """Calendar features of a future week (same code as the training panel's cyclic features)."""
+    return {name: values[0] for name, values in week_calendar([week_start]).items()}
+
+
+def iter_forecast_weeks(
+    model,
+    df_historical: pd.DataFrame,
+    feature_cols: list,
+    n_weeks: int = 12,
+    keys: list = None,
+    static_cols: list = None
+):
+    """
+    Roll the autoregressive forecast one week at a time (see forecast_weeks).
+
+    Yields:
+        (week_start, units, X, pred) per future week: the key columns of every
+        series, the feature matrix the model was called with and its raw
+        predictions
+    """
+    keys = keys or ['h3_cell']
+    static_cols = static_cols if static_cols is not None else ['bairro_encoded']
+
+    last_week = pd.Timestamp(df_historical['week_start'].max())
+    series = df_historical.groupby(keys, sort=False).ngroup().to_numpy()
+    units = df_historical[keys].drop_duplicates().reset_index(drop=True)
+    n_series = len(units)
+    state = _series_state(df_historical, series, n_series, static_cols)
+    window, counts, totals = state['window'], state['counts'], state['totals']
+
+    for week_offset in range(1, n_weeks + 1):
+        next_week_start = last_week + pd.Timedelta(weeks=week_offset)
+
+        mean_4w = np.nanmean(window[:, -4:], axis=1)
+        columns = dict(calendar_row(next_week_start))
+        columns.update(state['static'])
+        columns.update({
+            'sinistros_lag_1w': window[:, -1],
+            'sinistros_lag_4w': np.where(counts >= 4, mean_4w, 0.0),
+            'sinistros_mean_4w': mean_4w,
+            'sinistros_mean_12w': np.nanmean(window, axis=1),
+            'total_historical_cell': totals,
+        })
+
+        X = pd.DataFrame({
+            col: np.broadcast_to(columns.get(col, 0), n_series) for col in feature_cols
+        })
+        pred = np.asarray(model.predict(X), dtype=float)
+        yield next_week_start, units, X, pred
+
+        window = np.roll(window, -1, axis=1)
+        window[:, -1] = pred
+        counts = counts + 1
+        totals = totals + pred
+
+
+def forecast_weeks(
+    model,
+    df_historical: pd.DataFrame,
+    feature_cols: list,
+    n_weeks: int = 12,
+    keys: list = None,
+    static_cols: list = None
+) -> pd.DataFrame:
+    """
+    Vectorized autoregressive forecast for the next n_weeks.
+
+    Produces the same features and predictions as generate_predictions,
+    but keeps a rolling 12-week window per series in a NumPy array and calls
+    model.predict once per future week for all series instead of once per row.
+
+    Args:
+        model: Anything with a predict(DataFrame) method (e.g. lgb.Booster)
+        df_historical: Weekly panel with historical features
+        feature_cols: Feature columns expected by the model
+        n_weeks: Number of weeks to forecast
+        keys: Columns identifying a series (default: ['h3_cell'])
+        static_cols: Columns carried forward from each series' last row
+            (default: ['bairro_encoded'])
+
+    Returns:
+        DataFrame with the key columns, week_start and predicted_accidents
+    """
+    predictions = [
+        units.assign(week_start=week_start, predicted_accidents=np.maximum(0, pred))
+        for week_start, units, _, pred in iter_forecast_weeks(
+            model, df_historical, feature_cols, n_weeks, keys, static_cols
+        )
+    ]
+    return pd.concat(predictions, ignore_index=True)
+
+
+def generate_predictions(model, df_historical, feature_cols, n_weeks=12):
+    """
+    Generates autoregressive forecasts for the next n_weeks.
+    """
+    last_week = df_historical['week_start'].max()
+    h3_cells = df_historical['h3_cell'].unique()
+    total_cells = len(h3_cells)
+
+    print(f"  - Unique H3 cells: {total_cells:,}")
+    print(f"  - Future weeks: {n_weeks}")
+    print(f"  - Total predictions: {total_cells * n_weeks:,}")
+
+    predictions = []
+    df_future = df_historical.copy()
+
+    for week_offset in range(1, n_weeks + 1):
+        next_week_start = last_week + pd.Timedelta(weeks=week_offset)
+        calendar = calendar_row(next_week_start)
+
+        print(f"\n  [Week {week_offset}/{n_weeks}] Predicting for {next_week_start.date()}...")
+
+        for idx, cell in enumerate(h3_cells):
+            if idx % max(1, total_cells // 10) == 0:
+                print(f"    → Progress: {idx}/{total_cells} cells ({100 * idx // total_cells}%)", end="\r")
+
+            # Calendar and cyclic features, computed once per week
+            base_row = {
+                'h3_cell': cell,
+                'week_start': next_week_start,
+                **calendar,
+                'num_sinistros': 0
+            }
+
+            # Historical context
+            hist = df_future[df_future['h3_cell'] == cell].sort_values('week_start')
+            if len(hist) > 0:
+                base_row['sinistros_lag_1w'] = hist.iloc[-1]['num_sinistros']
+                base_row['sinistros_lag_4w'] = hist['num_sinistros'].iloc[-4:].mean() if len(hist) >= 4 else 0
+                base_row['sinistros_mean_4w'] = hist['num_sinistros'].iloc[-4:].mean()
+                base_row['sinistros_mean_12w'] = hist['num_sinistros'].iloc[-12:].mean() if len(hist) >= 12 else hist['num_sinistros'].mean()
+                base_row['total_historical_cell'] = hist['num_sinistros'].sum()
+
+                for v in ['auto', 'moto', 'onibus', 'caminhao']:
+                    col = f'{v}_historical'
+                    base_row[col] = hist.iloc[-1][col] if col in hist.columns else 0
+            else:
+                for col in ['sinistros_lag_1w', 'sinistros_lag_4w', 'sinistros_mean_4w',
+                            'sinistros_mean_12w', 'total_historical_cell']:
+                    base_row[col] = 0
+                for v in ['auto', 'moto', 'onibus', 'caminhao']:
+                    base_row[f'{v}_historical'] = 0
+
+            base_row['bairro_encoded'] = hist.iloc[-1]['bairro_encoded'] if 'bairro_encoded' in hist.columns and len(hist) > 0 else 0
+
+            # Prediction
+            X_row = pd.DataFrame([{col: base_row.get(col, 0) for col in feature_cols}])
+            pred = model.predict(X_row)[0]
+            base_row['predicted_accidents'] = max(0, pred)
+
+            predictions.append({
+                'h3_cell': cell,
+                'week_start': next_week_start,
+                'predicted_accidents': base_row['predicted_accidents']
+            })
+
+            base_row['num_sinistros'] = pred
+            df_future = pd.concat([df_future, pd.DataFrame([base_row])], ignore_index=True)
+
+        print(f"    → Progress: {total_cells}/{total_cells} cells (100%)")
+
+    print(f"\n  Predictions generated: {len(predictions):,} records")
+    return pd.DataFrame(predictions)
@@ -0,0 +1,228 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.config.config import (
+    PANDEMIC_YEARS,
+    VEHICLE_COLUMNS,
+    VICTIM_COLUMNS,
+    INCREMENTAL_METHOD,
+    INCREMENTAL_WINDOW_WEEKS,
+    INCREMENTAL_BOOST_ROUNDS,
+    INCREMENTAL_MAX_TREES,
+    INCREMENTAL_REFIT_DECAY,
+    INCREMENTAL_DRIFT_THRESHOLD
+)
+from src.preprocessing.cube import AggregateCube
+from src.utils import add_historical_features, add_cyclic_features
+from src.modeling.lgb_model import poisson_deviance
+
+MODEL_FILE = "lgb_model.txt"
+FEATURES_FILE = "features_weekly.pkl"
+METADATA_FILE = "metadata.json"
+
+# Longest look-back of add_historical_features (sinistros_mean_12w)
+CONTEXT_WEEKS = 12
+
+
+def load_previous_run(export_dir: Path) -> Optional[dict]:
+    """
+    Load the model, weekly feature panel and metadata written by the last run.
+    Returns None if any of them is missing.
+    """
+    paths = {name: export_dir / name for name in (MODEL_FILE, FEATURES_FILE, METADATA_FILE)}
+    missing = [name for name, path in paths.items() if not path.exists()]
+    if missing:
+        print(f"  -> No previous run to update (missing: {', '.join(missing)})")
+        return None
+
+    with open(paths[METADATA_FILE]) as f:
+        metadata = json.load(f)
+
+    return {
+        'model': lgb.Booster(model_file=str(paths[MODEL_FILE])),
+        'features': pd.read_pickle(paths[FEATURES_FILE]),
+        'metadata': metadata
+    }
+
+
+def extend_features(df_prev: pd.DataFrame, df_weekly_new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Append newly aggregated weeks to a previous feature panel, computing
+    historical features only for the new weeks.
+
+    The new weeks are expanded to the complete grid of known cells (cells seen
+    for the first time also get zero rows for the previous weeks), and
+    add_historical_features runs on them plus the last CONTEXT_WEEKS weeks of
+    the previous panel. Cumulative totals are then offset by each cell's
+    counts before that context window, which gives the same values as
+    recomputing the features over the whole history.
+
+    Args:
+        df_prev: Feature panel of the previous run
+        df_weekly_new: Weekly panel (AggregateCube.weekly_panel) of the new weeks only
+
+    Returns:
+        Feature panel covering the previous and the new weeks
+    """
+    first_new = df_weekly_new['week_start'].min()
+    prev = df_prev[df_prev['week_start'] < first_new]
+
+    # Complete grid: known cells x new weeks, plus zero history for cells seen for the first time
+    cells = pd.unique(pd.concat([prev['h3_cell'], df_weekly_new['h3_cell']]))
+    new_cells = np.setdiff1d(cells, prev['h3_cell'].unique())
+    new_weeks = np.sort(df_weekly_new['week_start'].unique())
+    grid = pd.concat([
+        pd.MultiIndex.from_product([new_cells, prev['week_start'].unique()], names=['h3_cell', 'week_start']).to_frame(index=False),
+        pd.MultiIndex.from_product([cells, new_weeks], names=['h3_cell', 'week_start']).to_frame(index=False)
+    ], ignore_index=True)
+    new = grid.merge(df_weekly_new, on=['h3_cell', 'week_start'], how='left')
+
+    # Same filling rules as aggregate_weekly_by_h3 for weeks without accidents
+    new['num_sinistros'] = new['num_sinistros'].fillna(0)
+    for col in VEHICLE_COLUMNS + VICTIM_COLUMNS + ['holiday', 'weekend']:
+        if col in new.columns:
+            new[col] = new[col].fillna(0)
+    iso = new['week_start'].dt.isocalendar()
+    new['year_week'] = iso.year * 100 + iso.week
+    new['year'] = new['year'].fillna(new['week_start'].dt.year)
+    new['month'] = new['month'].fillna(new['week_start'].dt.month)
+    new['week_of_year'] = iso.week
+
+    # bairro_clean is only there when the panel was aggregated with it
+    cell_meta_cols = [c for c in ('latitude', 'longitude', 'bairro_clean') if c in prev.columns]
+    cell_meta = pd.concat([prev, df_weekly_new]).groupby('h3_cell')[cell_meta_cols].last()
+    for col in cell_meta.columns:
+        new[col] = new[col].fillna(new['h3_cell'].map(cell_meta[col]))
+
+    # Recompute rolling features over a short context window only
+    context_start = np.sort(prev['week_start'].unique())[-CONTEXT_WEEKS:].min() if len(prev) else first_new
+    context = prev[prev['week_start'] >= context_start]
+    new['_new'] = True
+    window = add_historical_features(pd.concat([context[df_weekly_new.columns.intersection(context.columns)], new]))
+    new = add_cyclic_features(window[window['_new'].eq(True)].drop(columns='_new'), inplace=True)
+
+    sum_cols = ['num_sinistros'] + [v for v in VEHICLE_COLUMNS if f'{v}_historical' in new.columns]
+    offsets = prev[prev['week_start'] < context_start].groupby('h3_cell')[sum_cols].sum()
+    new['total_historical_cell'] += new['h3_cell'].map(offsets['num_sinistros']).fillna(0)
+    for v in sum_cols[1:]:
+        new[f'{v}_historical'] += new['h3_cell'].map(offsets[v]).fillna(0)
+
+    df_features = pd.concat([prev, new[prev.columns.intersection(new.columns)]], ignore_index=True)
+    # The grid built from numpy arrays holds the cells as objects
+    return df_features.astype({'h3_cell': prev['h3_cell'].dtype})
+
+
+def update_model(
+    model: lgb.Booster,
+    df_features: pd.DataFrame,
+    first_new_week: pd.Timestamp,
+    reference_deviance: float,
+    params: dict
+) -> Optional[lgb.Booster]:
+    """
+    Update a trained model with the most recent weeks instead of retraining it.
+
+    The previous model is first scored on the new weeks. If its Poisson deviance
+    exceeds reference_deviance by more than INCREMENTAL_DRIFT_THRESHOLD, or
+    boosting would grow the model past INCREMENTAL_MAX_TREES, None is returned
+    and the caller should fall back to a full retrain. Otherwise the model is
+    updated on the last INCREMENTAL_WINDOW_WEEKS weeks, either by refitting its
+    leaf values ('refit') or by continuing to boost from it ('boost').
+    """
+    feature_cols = model.feature_name()
+
+    new = df_features[df_features['week_start'] >= first_new_week]
+    deviance = poisson_deviance(new['num_sinistros'].to_numpy(), model.predict(new[feature_cols]))
+    limit = reference_deviance * (1 + INCREMENTAL_DRIFT_THRESHOLD)
+    print(f"  - Deviance on new weeks: {deviance:.4f} (reference {reference_deviance:.4f}, limit {limit:.4f})")
+    if deviance > limit:
+        print("  -> Deviance drifted beyond threshold, full retrain required")
+        return None
+
+    weeks = np.sort(df_features['week_start'].unique())
+    recent = df_features[df_features['week_start'] >= weeks[-INCREMENTAL_WINDOW_WEEKS:].min()]
+    X, y = recent[feature_cols], recent['num_sinistros']
+    print(f"  - Updating on last {INCREMENTAL_WINDOW_WEEKS} weeks ({len(recent):,} rows, method: {INCREMENTAL_METHOD})")
+
+    if INCREMENTAL_METHOD == 'refit':
+        return model.refit(X, y, decay_rate=INCREMENTAL_REFIT_DECAY)
+
+    if model.num_trees() + INCREMENTAL_BOOST_ROUNDS > INCREMENTAL_MAX_TREES:
+        print(f"  -> Model would exceed {INCREMENTAL_MAX_TREES} trees, full retrain required")
+        return None
+    train_data = lgb.Dataset(X, label=y, feature_name=feature_cols)
+    return lgb.train(params, train_data, num_boost_round=INCREMENTAL_BOOST_ROUNDS, init_model=model)
+
+
+def _same_weeks(df_prev: pd.DataFrame, df_weekly_new: pd.DataFrame, last_week: pd.Timestamp) -> bool:
+    """True if df_weekly_new only holds last_week, with the counts df_prev has for it."""
+    if (df_weekly_new['week_start'] != last_week).any():
+        return False
+    counts = [
+        df.loc[df['num_sinistros'] > 0].groupby('h3_cell')['num_sinistros'].sum()
+        for df in (df_prev[df_prev['week_start'] == last_week], df_weekly_new)
+    ]
+    return counts[0].index.equals(counts[1].index) and np.array_equal(counts[0].to_numpy(), counts[1].to_numpy())
+
+
+def incremental_update(cube: AggregateCube, export_dir: Path, params: dict) -> Optional[dict]:
+    """
+    Weekly refresh without a full retrain.
+
+    Reduces only the cube's days from the last exported week onwards, extends
+    the stored feature panel and updates the stored model. When nothing
+    changed since the last export (no later weeks, same counts in the last
+    week), the previous model and panel are returned as they are. Returns
+    None when there is no previous run or the update falls back to a full
+    retrain.
+
+    Returns:
+        Dict with 'model', 'features' (full panel), 'feature_cols' and
+        'reference_deviance' (carried over from the last full training)
+    """
+    previous = load_previous_run(export_dir)
+    if previous is None:
+        return None
+
+    reference_deviance = previous['metadata'].get('cv_metrics', {}).get('poisson_deviance')
+    if reference_deviance is None:
+        print("  -> Previous metadata has no CV deviance, full retrain required")
+        return None
+
+    # The last exported week may have been incomplete, so it is recomputed
+    df_prev = previous['features']
+    first_new = df_prev['week_start'].max()
+    unchanged = {
+        'model': previous['model'],
+        'features': df_prev,
+        'feature_cols': previous['model'].feature_name(),
+        'reference_deviance': reference_deviance
+    }
+    if cube.rollup(None, None, since=first_new)['num_sinistros'].iloc[0] == 0:
+        print("  -> No records since the last exported week, previous model kept")
+        return unchanged
+
+    df_weekly_new = cube.weekly_panel(PANDEMIC_YEARS, since=first_new)
+    if _same_weeks(df_prev, df_weekly_new, first_new):
+        print("  -> No new records since the last export, previous model kept")
+        return unchanged
+
+    df_features = extend_features(df_prev, df_weekly_new)
+    n_weeks = df_features['week_start'].nunique() - df_prev['week_start'].nunique() + 1
+    print(f"  - Weeks (re)computed: {n_weeks}")
+
+    model = update_model(previous['model'], df_features, first_new, reference_deviance, params)
+    if model is None:
+        return None
+
+    return {
+        'model': model,
+        'features': df_features,
+        'feature_cols': model.feature_name(),
+        'reference_deviance': reference_deviance
+    }
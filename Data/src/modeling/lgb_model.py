@@ -1,9 +1,11 @@
 # lgb_model.py
+import time
 import lightgbm as lgb
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import numpy as np
-from src.config.config import USE_GPU, GPU_DEVICE_ID
+import pandas as pd
+from src.config.config import USE_GPU, GPU_DEVICE_ID, RANDOM_STATE, ZERO_SAMPLE_STRATA
 
 def poisson_deviance(y_true, y_pred):
     """Calculates Poisson Deviance (lower is better)."""
@@ -12,7 +14,52 @@ def poisson_deviance(y_true, y_pred):
     term1 = np.where(y_true == 0, 0, y_true * np.log(y_true / y_pred))
     return 2 * np.mean(term1 - (y_true - y_pred))
 
-def train_lgb_model(X, y, feature_cols):
+def sample_zero_rows(y, cells, rate, n_strata=ZERO_SAMPLE_STRATA, random_state=RANDOM_STATE):
+    """
+    Keep every non-zero row and a stratified sample of the zero rows.
+
+    Cells are split into n_strata quantile bins of activity (mean count per
+    week), and within each bin a fraction `rate` of the zero rows is drawn.
+    Sampled zero rows get weight n_zero / n_sampled of their bin, so the
+    weighted zero mass of every bin is unchanged and Poisson predictions
+    stay calibrated. A rate of 1 keeps every row with weight 1.
+
+    Returns:
+        (indices, weights) of the rows to train on
+    """
+    if not 0 < rate <= 1:
+        raise ValueError(f"Zero-row sampling rate must be in (0, 1], got {rate}")
+    y = np.asarray(y, dtype=float)
+    if rate == 1:
+        return np.arange(len(y)), np.ones(len(y))
+
+    codes, _ = pd.factorize(np.asarray(cells))
+    activity = np.bincount(codes, weights=y) / np.bincount(codes)
+    edges = np.unique(np.quantile(activity, np.linspace(0, 1, n_strata + 1)[1:-1]))
+    stratum = np.searchsorted(edges, activity, side='right')[codes]
+
+    zero = y == 0
+    keep = ~zero
+    weights = np.ones(len(y))
+    rng = np.random.default_rng(random_state)
+    for s in np.unique(stratum[zero]):
+        idx = np.flatnonzero(zero & (stratum == s))
+        n = max(1, int(round(rate * len(idx))))
+        chosen = rng.choice(idx, n, replace=False)
+        keep[chosen] = True
+        weights[chosen] = len(idx) / n
+
+    indices = np.flatnonzero(keep)
+    return indices, weights[indices]
+
+def train_lgb_model(X, y, feature_cols, cells=None, zero_sample_rate=None):
+    """
+    Time-series CV of the LightGBM Poisson model.
+
+    With zero_sample_rate, each fold trains on the rows returned by
+    sample_zero_rows (cells required) and is still evaluated on all its
+    test rows.
+    """
     tscv = TimeSeriesSplit(n_splits=5)
     results = []
 
@@ -39,8 +86,15 @@ def train_lgb_model(X, y, feature_cols):
         X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
         y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
 
-        train_data = lgb.Dataset(X_train, label=y_train, feature_name=feature_cols)
+        weights = None
+        if zero_sample_rate:
+            idx, weights = sample_zero_rows(y_train, np.asarray(cells)[train_idx], zero_sample_rate)
+            X_train, y_train = X_train.iloc[idx], y_train.iloc[idx]
+
+        start = time.perf_counter()
+        train_data = lgb.Dataset(X_train, label=y_train, weight=weights, feature_name=feature_cols)
         model = lgb.train(params, train_data, num_boost_round=200)
+        train_time = time.perf_counter() - start
 
         y_pred = model.predict(X_test)
         
@@ -54,7 +108,38 @@ def train_lgb_model(X, y, feature_cols):
             'fold': fold,
             'mae': mae,
             'rmse': rmse,
-            'poisson_deviance': deviance
+            'poisson_deviance': deviance,
+            'train_rows': len(y_train),
+            'train_time': train_time
+        })
+
+    return results
+
+def compare_zero_sampling(X, y, feature_cols, cells, rates):
+    """
+    Run the CV with full data and with each zero-row sampling rate, and report
+    training-set size, training time and CV metrics side by side.
+    """
+    rows = []
+    for rate in [None] + list(rates):
+        print(f"\n  Zero-row sampling rate: {rate or 'full data'}")
+        results = train_lgb_model(X, y, feature_cols, cells=cells, zero_sample_rate=rate)
+        rows.append({
+            'zero_sample_rate': rate if rate else 1.0,
+            'train_rows': np.mean([r['train_rows'] for r in results]),
+            'train_time': np.sum([r['train_time'] for r in results]),
+            'mae': np.mean([r['mae'] for r in results]),
+            'rmse': np.mean([r['rmse'] for r in results]),
+            'poisson_deviance': np.mean([r['poisson_deviance'] for r in results])
         })
 
-    return results
\ No newline at end of file
+    summary = pd.DataFrame(rows)
+    full = summary.iloc[0]
+    summary['size_reduction'] = 1 - summary['train_rows'] / full['train_rows']
+    summary['time_saved'] = 1 - summary['train_time'] / full['train_time']
+
+    print("\n  rate   rows      reduction  time(s)  saved   MAE     RMSE    Deviance")
+    for r in summary.itertuples():
+        print(f"  {r.zero_sample_rate:<6.2f} {r.train_rows:<9,.0f} {r.size_reduction:>8.1%}  "
+              f"{r.train_time:>7.2f} {r.time_saved:>6.1%}  {r.mae:.4f}  {r.rmse:.4f}  {r.poisson_deviance:.4f}")
+    return summary
\ No newline at end of file
@@ -0,0 +1,68 @@
+import lightgbm as lgb
+import pandas as pd
+
+from src.config.config import (
+    PANDEMIC_YEARS,
+    TIME_PERIODS,
+    FEATURE_COLUMNS,
+    N_BOOST_ROUNDS,
+    PREDICTION_WEEKS
+)
+from src.utils import (
+    aggregate_weekly_by_h3_period,
+    period_panel_to_frame,
+    add_historical_features,
+    add_cyclic_features
+)
+from src.modeling.forecast import forecast_weeks
+
+PERIOD_KEYS = ['h3_cell', 'period']
+
+# Cell/week columns of the weekly panel repeated on every period row
+WEEKLY_COLUMNS = [
+    'h3_cell', 'week_start', 'year', 'month', 'week_of_year', 'holiday', 'weekend',
+    'latitude', 'longitude', 'bairro_clean', 'bairro_encoded',
+    'auto', 'moto', 'onibus', 'caminhao'
+]
+
+
+def train_period_model(df: pd.DataFrame, df_weekly: pd.DataFrame, params: dict, n_weeks: int = PREDICTION_WEEKS) -> dict:
+    """
+    Train and forecast accident counts per H3 cell, week and time-of-day period.
+
+    Builds the cell × week × period panel in one pass over the records, extends
+    the historical features along the period axis (one series per cell and
+    period) and trains a single LightGBM model with the period as a feature.
+
+    Args:
+        df: Processed dataset with the TIME_PERIODS flag columns
+        df_weekly: Weekly panel (aggregate_weekly_by_h3 output or its features)
+        params: LightGBM parameters
+        n_weeks: Number of weeks to forecast
+
+    Returns:
+        Dict with 'model', 'features' (period panel), 'feature_cols' and
+        'predictions' (h3_cell, period, week_start, predicted_accidents)
+    """
+    print("TIME-OF-DAY PANEL")
+    panel = aggregate_weekly_by_h3_period(df, list(TIME_PERIODS), pandemic_years=PANDEMIC_YEARS)
+    df_weekly = df_weekly[[c for c in WEEKLY_COLUMNS if c in df_weekly.columns]]
+    df_period = period_panel_to_frame(panel, df_weekly)
+    # deep=True: string columns (h3_cell, period, bairro) dominate the footprint
+    print(f"  - Weekly panel: {len(df_weekly):,} rows, {df_weekly.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+    print(f"  - Long panel: {len(df_period):,} rows, {df_period.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+    df_period = add_historical_features(df_period, keys=PERIOD_KEYS)
+    add_cyclic_features(df_period, inplace=True)
+
+    feature_cols = [col for col in FEATURE_COLUMNS if col in df_period.columns] + ['period_code']
+    train_data = lgb.Dataset(df_period[feature_cols], label=df_period['num_sinistros'], feature_name=feature_cols)
+    model = lgb.train(params, train_data, num_boost_round=N_BOOST_ROUNDS)
+
+    predictions = forecast_weeks(
+        model, df_period, feature_cols, n_weeks,
+        keys=PERIOD_KEYS, static_cols=['bairro_encoded', 'period_code']
+    )
+    print(f"  - Period predictions: {len(predictions):,} records")
+
+    return {'model': model, 'features': df_period, 'feature_cols': feature_cols, 'predictions': predictions}
@@ -0,0 +1,269 @@
+"""
+Region-sharded feature engineering and forecasting.
+
+Cells are partitioned by their H3 parent at SHARD_RESOLUTION. Each shard is a
+directory under the shard root holding its weekly panel (core cells plus a
+halo of SHARD_HALO_RINGS neighbor rings from adjacent shards), and the
+features and predictions of its core cells once processed. Shards are
+claimed through lock files created with O_EXCL, so the local process pool
+and workers on other machines sharing the directory can run side by side:
+
+    python -m src.modeling.sharding --shard-dir shards --phase features
+    python -m src.modeling.sharding --shard-dir shards --phase forecast
+
+The coordinator (sharded_features / sharded_forecast, called from main.py)
+partitions the panel, processes the shards it can claim and waits for the
+rest, then merges the outputs in the same order as the unsharded run. A lock
+records its owner (host and PID); locks of dead local processes or older than
+SHARD_LOCK_STALE_SECONDS are reclaimed, and the coordinator raises
+TimeoutError after SHARD_WAIT_SECONDS.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import h3
+import pandas as pd
+
+from src.config.config import (
+    SHARD_DIR,
+    SHARD_RESOLUTION,
+    SHARD_HALO_RINGS,
+    SHARD_WORKERS,
+    SHARD_LOCK_STALE_SECONDS,
+    SHARD_WAIT_SECONDS
+)
+from src.utils import add_historical_features
+
+PLAN_FILE = "plan.json"
+FORECAST_FILE = "forecast.json"
+PHASE_OUTPUTS = {'features': "features.pkl", 'forecast': "predictions.pkl"}
+
+
+def plan_shards(cells, resolution: int = SHARD_RESOLUTION, halo_rings: int = SHARD_HALO_RINGS) -> dict:
+    """
+    Partition cells by H3 parent.
+
+    Returns:
+        Dict parent cell -> {'core': cells of the shard, 'halo': cells of other
+        shards within halo_rings of a core cell}
+    """
+    cells = sorted(set(cells))
+    known = set(cells)
+    plan = {}
+    for cell in cells:
+        plan.setdefault(h3.cell_to_parent(cell, resolution), {'core': [], 'halo': []})['core'].append(cell)
+
+    for shard in plan.values():
+        core = set(shard['core'])
+        ring = {n for c in shard['core'] for n in h3.grid_disk(c, halo_rings)} if halo_rings else set()
+        shard['halo'] = sorted((ring & known) - core)
+    return plan
+
+
+def partition(df_weekly: pd.DataFrame, shard_root: Path = SHARD_DIR, **plan_kwargs) -> dict:
+    """Write each shard's weekly panel (core + halo rows) under a fresh shard_root."""
+    shard_root = Path(shard_root)
+    shutil.rmtree(shard_root, ignore_errors=True)
+    shard_root.mkdir(parents=True)
+
+    plan = plan_shards(df_weekly['h3_cell'].unique(), **plan_kwargs)
+    rows_by_cell = df_weekly.groupby('h3_cell', sort=False).indices
+    for parent, shard in plan.items():
+        shard_dir = shard_root / parent
+        shard_dir.mkdir()
+        rows = [i for cell in shard['core'] + shard['halo'] for i in rows_by_cell[cell]]
+        df_weekly.iloc[sorted(rows)].to_pickle(shard_dir / "weekly.pkl")
+
+    with open(shard_root / PLAN_FILE, "w") as f:
+        json.dump(plan, f)
+    return plan
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()} {os.getpid()}"
+
+
+def _is_stale(lock: Path, owner: str) -> bool:
+    """True if the lock's owner is a dead process of this host or the lock is too old."""
+    host, _, pid = owner.partition(' ')
+    if host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+    try:
+        return time.time() - lock.stat().st_mtime > SHARD_LOCK_STALE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def _claim(shard_dir: Path, phase: str, reclaim: bool = True) -> bool:
+    lock = shard_dir / f"{phase}.lock"
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            owner = lock.read_text()
+        except FileNotFoundError:
+            return False
+        if not reclaim or not _is_stale(lock, owner):
+            return False
+
+        # Several workers may find the same stale lock: only the one whose
+        # rename moved that lock (and not a fresh one) goes on to claim
+        moved = lock.with_name(f".{lock.name}.{uuid.uuid4().hex}")
+        try:
+            os.rename(lock, moved)
+        except FileNotFoundError:
+            return False
+        if moved.read_text() != owner:
+            try:
+                os.link(moved, lock)
+            except FileExistsError:
+                pass
+            moved.unlink()
+            return False
+        moved.unlink()
+        print(f"  - Reclaimed stale {phase} lock of {shard_dir.name} (owner {owner})")
+        return _claim(shard_dir, phase, reclaim=False)
+
+    with os.fdopen(fd, "w") as f:
+        f.write(_owner())
+    return True
+
+
+def _write(df: pd.DataFrame, path: Path) -> None:
+    # Output appears atomically: its presence marks the shard as done
+    tmp = path.with_name(f".{path.name}.tmp")
+    df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def process_shard(shard_root: Path, parent: str, phase: str) -> bool:
+    """
+    Run one phase of one shard unless another worker claimed it.
+
+    'features' computes historical features over core + halo cells and keeps
+    the core rows; 'forecast' rolls the forecast of the core cells with the
+    model described in FORECAST_FILE.
+
+    Returns:
+        True if this call processed the shard
+    """
+    shard_root = Path(shard_root)
+    shard_dir = shard_root / parent
+    if (shard_dir / PHASE_OUTPUTS[phase]).exists() or not _claim(shard_dir, phase):
+        return False
+
+    with open(shard_root / PLAN_FILE) as f:
+        core = json.load(f)[parent]['core']
+
+    if phase == 'features':
+        df_weekly = pd.read_pickle(shard_dir / "weekly.pkl")
+        df_features = add_historical_features(df_weekly)
+        _write(df_features[df_features['h3_cell'].isin(core)], shard_dir / PHASE_OUTPUTS[phase])
+    else:
+        from src.modeling.forecast import forecast_weeks, load_model
+
+        with open(shard_root / FORECAST_FILE) as f:
+            spec = json.load(f)
+        df_features = pd.read_pickle(shard_dir / PHASE_OUTPUTS['features'])
+        model = load_model(Path(spec['model_path']))
+        df_predictions = forecast_weeks(model, df_features, spec['feature_cols'], spec['n_weeks'])
+        _write(df_predictions, shard_dir / PHASE_OUTPUTS[phase])
+    return True
+
+
+def reset_phase(shard_root: Path, phase: str) -> None:
+    """Remove the outputs and locks of a phase, so every shard runs it again."""
+    shard_root = Path(shard_root)
+    with open(shard_root / PLAN_FILE) as f:
+        parents = list(json.load(f))
+    for parent in parents:
+        (shard_root / parent / PHASE_OUTPUTS[phase]).unlink(missing_ok=True)
+        (shard_root / parent / f"{phase}.lock").unlink(missing_ok=True)
+
+
+def run_worker(shard_root: Path, phase: str) -> int:
+    """Process every shard of a phase that nobody else claimed. Returns the number processed."""
+    with open(Path(shard_root) / PLAN_FILE) as f:
+        parents = list(json.load(f))
+    return sum(process_shard(shard_root, parent, phase) for parent in parents)
+
+
+def _run_phase(
+    shard_root: Path,
+    phase: str,
+    n_workers: Optional[int],
+    poll_seconds: float = 1.0,
+    timeout: float = SHARD_WAIT_SECONDS
+) -> pd.DataFrame:
+    shard_root = Path(shard_root)
+    with open(shard_root / PLAN_FILE) as f:
+        parents = list(json.load(f))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(process_shard, shard_root, parent, phase) for parent in parents]
+        processed = sum(future.result() for future in futures)
+
+    # Shards claimed by other workers; those whose lock went stale are processed here
+    deadline = time.monotonic() + timeout
+    outputs = {parent: shard_root / parent / PHASE_OUTPUTS[phase] for parent in parents}
+    while missing := [parent for parent, path in outputs.items() if not path.exists()]:
+        processed += sum(process_shard(shard_root, parent, phase) for parent in missing)
+        if all(path.exists() for path in outputs.values()):
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{phase}: shards not finished after {timeout:.0f}s: {', '.join(missing)}")
+        time.sleep(poll_seconds)
+
+    print(f"  - {phase}: {len(parents)} shards ({processed} processed locally)")
+    return pd.concat([pd.read_pickle(path) for path in outputs.values()])
+
+
+def sharded_features(df_weekly: pd.DataFrame, shard_root: Path = SHARD_DIR, n_workers: Optional[int] = SHARD_WORKERS) -> pd.DataFrame:
+    """Sharded equivalent of add_historical_features(df_weekly) (same rows, order and index)."""
+    plan = partition(df_weekly, shard_root)
+    print(f"  - Sharded {df_weekly['h3_cell'].nunique():,} cells into {len(plan)} regions "
+          f"(H3 res {SHARD_RESOLUTION}, {SHARD_HALO_RINGS}-ring halo)")
+    df_features = _run_phase(shard_root, 'features', n_workers)
+    return df_features.sort_values(['h3_cell', 'week_start'])
+
+
+def sharded_forecast(
+    model_path: Path,
+    feature_cols: list,
+    n_weeks: int,
+    shard_root: Path = SHARD_DIR,
+    n_workers: Optional[int] = SHARD_WORKERS
+) -> pd.DataFrame:
+    """
+    Sharded equivalent of forecast_weeks over the features written by
+    sharded_features, with the model saved at model_path. Forecasts left in
+    the shards by an earlier call (e.g. of a previous model) are discarded.
+    """
+    shard_root = Path(shard_root)
+    reset_phase(shard_root, 'forecast')
+    with open(shard_root / FORECAST_FILE, "w") as f:
+        json.dump({'model_path': str(Path(model_path).resolve()), 'feature_cols': feature_cols, 'n_weeks': n_weeks}, f)
+
+    df_predictions = _run_phase(shard_root, 'forecast', n_workers)
+    return df_predictions.sort_values(['week_start', 'h3_cell']).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process the shards of a phase claimed by this worker")
+    parser.add_argument("--shard-dir", default=str(SHARD_DIR))
+    parser.add_argument("--phase", choices=list(PHASE_OUTPUTS), required=True)
+    args = parser.parse_args()
+    print(f"Processed {run_worker(Path(args.shard_dir), args.phase)} shards")
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.config.config import (
+    FEATURE_COLUMNS,
+    N_BOOST_ROUNDS,
+    MODEL_CONFIG,
+    USE_GPU,
+    GPU_DEVICE_ID,
+    BACKEND_EXPORT_DIR,
+    ZERO_SAMPLE_RATE,
+    ZERO_SAMPLE_COMPARE,
+    ZERO_SAMPLE_COMPARE_RATES
+)
+from src.preprocessing.cube import AggregateCube
+from src.modeling.lgb_model import train_lgb_model, sample_zero_rows, compare_zero_sampling
+from src.modeling.poisson_model import train_poisson
+from src.modeling.features import build_weekly_features
+
+
+def model_params() -> dict:
+    """MODEL_CONFIG with the CPU / GPU device settings."""
+    params = MODEL_CONFIG.copy()
+    if USE_GPU:
+        params.update({'device': 'gpu', 'gpu_device_id': GPU_DEVICE_ID})
+    else:
+        params.update({'device': 'cpu', 'num_threads': -1})
+    return params
+
+
+def run_poisson_baseline(cube: AggregateCube) -> None:
+    print("\n[EXTRA] Training baseline Poisson model...")
+    try:
+        poisson_results = train_poisson(cube)
+        print(f"  -> Fitted {poisson_results['n_cells']} cell effects in {poisson_results['fit_time']:.1f}s")
+        print(f"  -> Poisson Model Metrics (holdout from {poisson_results['holdout_start']:%Y-%m-%d}, "
+              f"without location effects in parentheses):")
+        metrics, global_metrics = poisson_results['metrics'], poisson_results['global_metrics']
+        print(f"     - MAE: {metrics['MAE']:.4f} ({global_metrics['MAE']:.4f})")
+        print(f"     - RMSE: {metrics['RMSE']:.4f} ({global_metrics['RMSE']:.4f})")
+        print(f"     - Poisson Deviance: {metrics['Poisson Deviance']:.4f} ({global_metrics['Poisson Deviance']:.4f})")
+    except Exception as e:
+        print(f"  -> Failed to train Poisson model. Error: {e}")
+
+
+def fit_model(df_features: pd.DataFrame, params: dict):
+    """
+    LightGBM training on the whole feature panel and time-series CV.
+
+    Returns:
+        (model, feature columns, CV metrics)
+    """
+    print("\n[3/4] Training LightGBM model...")
+    available_features = [col for col in FEATURE_COLUMNS if col in df_features.columns]
+    X = df_features[available_features]
+    y = df_features['num_sinistros']
+    cells = df_features['h3_cell']
+
+    if ZERO_SAMPLE_RATE:
+        idx, weights = sample_zero_rows(y, cells, ZERO_SAMPLE_RATE)
+        print(f"  - Zero-row sampling ({ZERO_SAMPLE_RATE:.0%}): {len(idx):,} of {len(y):,} rows")
+        train_data = lgb.Dataset(X.iloc[idx], label=y.iloc[idx], weight=weights, feature_name=available_features)
+    else:
+        train_data = lgb.Dataset(X, label=y, feature_name=available_features)
+    model = lgb.train(params, train_data, num_boost_round=N_BOOST_ROUNDS)
+    results = train_lgb_model(X, y, available_features, cells=cells, zero_sample_rate=ZERO_SAMPLE_RATE)
+
+    if ZERO_SAMPLE_COMPARE:
+        print("\n[EXTRA] Comparing zero-row sampling rates...")
+        comparison = compare_zero_sampling(X, y, available_features, cells, ZERO_SAMPLE_COMPARE_RATES)
+        comparison.to_csv(Path(BACKEND_EXPORT_DIR) / "zero_sampling_comparison.csv", index=False)
+
+    avg_mae = np.mean([r['mae'] for r in results])
+    avg_rmse = np.mean([r['rmse'] for r in results])
+    avg_deviance = np.mean([r['poisson_deviance'] for r in results])
+
+    print(f"\n✅ LightGBM CV Results → MAE: {avg_mae:.4f} | RMSE: {avg_rmse:.4f} | Poisson Deviance: {avg_deviance:.4f}")
+
+    cv_metrics = {'mae': avg_mae, 'rmse': avg_rmse, 'poisson_deviance': avg_deviance}
+    return model, available_features, cv_metrics
+
+
+def train_full(cube: AggregateCube, params: dict):
+    """
+    Full retrain: weekly aggregation, feature engineering, LightGBM training
+    on the whole history and time-series CV.
+    """
+    run_poisson_baseline(cube)
+    df_features = build_weekly_features(cube)
+    model, available_features, cv_metrics = fit_model(df_features, params)
+    return model, df_features, available_features, cv_metrics
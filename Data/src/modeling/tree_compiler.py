@@ -0,0 +1,235 @@
+"""
+Compile a LightGBM text model (lgb_model.txt) into flat NumPy arrays.
+
+    python -m src.modeling.tree_compiler [--export-dir backend_export] [--repeats 200]
+
+CompiledModel evaluates the whole ensemble with NumPy only (lightgbm is not
+imported) and can be passed wherever a Booster is used for prediction. The
+command-line entry point checks it against Booster.predict on the exported
+feature panel and compares the latency of single-row and all-cells calls.
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from src.config.config import BACKEND_EXPORT_DIR
+
+# decision_type bits, as in LightGBM's tree.h
+_DEFAULT_LEFT_MASK = 2
+_MISSING_ZERO = 1
+_MISSING_NAN = 2
+_ZERO_THRESHOLD = 1e-35
+
+# Objectives whose output is exp(raw score)
+_EXP_OBJECTIVES = ('poisson', 'gamma', 'tweedie')
+
+
+def _parse(text: str) -> tuple:
+    """Split the model text into its header and one key/value dict per tree."""
+    header, trees, current = {}, [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line == 'end of trees':
+            break
+        if line.startswith('Tree='):
+            current = {}
+            trees.append(current)
+        elif '=' in line:
+            key, value = line.split('=', 1)
+            (header if current is None else current)[key] = value
+    return header, trees
+
+
+def _values(tree: dict, key: str, dtype) -> np.ndarray:
+    return np.array(tree[key].split(), dtype=dtype) if tree.get(key) else np.empty(0, dtype=dtype)
+
+
+class CompiledModel:
+    """
+    Tree ensemble as flat node arrays.
+
+    Every tree's internal nodes and leaves are numbered into shared arrays:
+    feature, threshold, children (right at 2 * node, left at 2 * node + 1)
+    and value. Leaves point to themselves and have value set, so a batch
+    traversal is depth steps of fancy indexing over all rows and trees at
+    once, with no per-tree or per-row Python loop; pairs that reached a leaf
+    are dropped as the traversal goes deeper. The direction of missing
+    values is resolved per node at compile time (nan_left), and that step is
+    skipped when the input has no NaN.
+    """
+
+    def __init__(self, text: str):
+        header, trees = _parse(text)
+        if int(header.get('num_class', 1)) != 1:
+            raise ValueError("Only single-output models are supported")
+
+        self.feature_names = header['feature_names'].split()
+        objective = header.get('objective', 'regression').split()[0]
+        self.exp_link = objective in _EXP_OBJECTIVES
+
+        feature, threshold, default_left, missing_type = [], [], [], []
+        left, right, value, roots = [], [], [], []
+        offset, depth = 0, 0
+        for tree in trees:
+            if int(tree.get('num_cat', 0)) > 0 or int(tree.get('is_linear', 0)):
+                raise ValueError("Categorical splits and linear trees are not supported")
+
+            leaf_value = _values(tree, 'leaf_value', float)
+            n_internal = int(tree['num_leaves']) - 1
+            n_nodes = n_internal + len(leaf_value)
+            decision = _values(tree, 'decision_type', np.int64)
+
+            # Children: >= 0 internal node, < 0 leaf ~child; leaves follow the internal nodes
+            def node_ids(children):
+                return np.where(children >= 0, children, n_internal + ~children) + offset
+
+            leaf_ids = np.arange(n_internal, n_nodes) + offset
+            feature.append(np.r_[_values(tree, 'split_feature', np.int64), np.zeros(len(leaf_value), np.int64)])
+            threshold.append(np.r_[_values(tree, 'threshold', float), np.full(len(leaf_value), np.inf)])
+            default_left.append(np.r_[(decision & _DEFAULT_LEFT_MASK) > 0, np.ones(len(leaf_value), bool)])
+            missing_type.append(np.r_[(decision >> 2) & 3, np.zeros(len(leaf_value), np.int64)])
+            left.append(np.r_[node_ids(_values(tree, 'left_child', np.int64)), leaf_ids])
+            right.append(np.r_[node_ids(_values(tree, 'right_child', np.int64)), leaf_ids])
+            value.append(np.r_[np.zeros(n_internal), leaf_value])
+            roots.append(offset)
+
+            depth = max(depth, self._tree_depth(left[-1] - offset, right[-1] - offset, n_internal))
+            offset += n_nodes
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold)
+        self.default_left = np.concatenate(default_left)
+        self.missing_type = np.concatenate(missing_type).astype(np.int8)
+        self.children = np.column_stack([np.concatenate(right), np.concatenate(left)]).ravel().astype(np.intp)
+        self.value = np.concatenate(value)
+
+        # NaN goes to the default child, except without a missing type, where it is read as 0
+        self.nan_left = np.where(self.missing_type == 0, 0.0 <= self.threshold, self.default_left)
+        self.has_zero_missing = bool(np.any(self.missing_type == _MISSING_ZERO))
+        self.is_leaf = self.children[0::2] == np.arange(len(self.value))
+        self.roots = np.array(roots, dtype=np.intp)
+        self.depth = depth
+
+    @staticmethod
+    def _tree_depth(left: np.ndarray, right: np.ndarray, n_internal: int) -> int:
+        depth, level = 0, [0] if n_internal else []
+        while level:
+            depth += 1
+            level = [c for n in level for c in (left[n], right[n]) if c < n_internal]
+        return depth
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "CompiledModel":
+        return cls(Path(path).read_text())
+
+    @classmethod
+    def from_booster(cls, booster) -> "CompiledModel":
+        return cls(booster.model_to_string())
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    def _matrix(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        return X.reshape(1, -1) if X.ndim == 1 else X
+
+    def predict(self, X, raw_score: bool = False) -> np.ndarray:
+        """
+        Predict like Booster.predict: sum of leaf values over all trees,
+        followed by exp for Poisson-type objectives unless raw_score.
+
+        Args:
+            X: DataFrame with the model's feature columns, or a 2-D array in
+                the model's feature order
+        """
+        X = np.ascontiguousarray(self._matrix(X))
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        has_nan = bool(np.isnan(flat).any())
+
+        # (row, tree) pairs still at an internal node, flattened
+        leaf = np.repeat(self.roots[None, :], n_rows, axis=0).ravel()
+        pair = np.arange(leaf.size)
+        node = leaf.copy()
+        row_offset = np.repeat(np.arange(n_rows) * n_features, self.num_trees)
+
+        for _ in range(self.depth):
+            x = flat[row_offset + self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if has_nan:
+                go_left = np.where(np.isnan(x), self.nan_left[node], go_left)
+            if self.has_zero_missing:
+                zero = (self.missing_type[node] == _MISSING_ZERO) & (np.nan_to_num(np.abs(x)) <= _ZERO_THRESHOLD)
+                go_left = np.where(zero, self.default_left[node], go_left)
+            node = self.children[2 * node + go_left]
+
+            # Most paths are much shorter than depth: keep only pairs still descending
+            done = self.is_leaf[node]
+            leaf[pair[done]] = node[done]
+            active = ~done
+            pair, node, row_offset = pair[active], node[active], row_offset[active]
+            if not len(pair):
+                break
+
+        leaf = leaf.reshape(n_rows, self.num_trees)
+        score = self.value[leaf].sum(axis=1)
+        return np.exp(score) if self.exp_link and not raw_score else score
+
+
+def _latency(predict, X, repeats: int) -> float:
+    predict(X)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict(X)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def benchmark(model_path: Path, X: pd.DataFrame, repeats: int = 200) -> pd.DataFrame:
+    """
+    Compare CompiledModel with Booster.predict on X (all rows) and on its first row.
+
+    Returns:
+        DataFrame with the latency of each call in milliseconds and the
+        largest absolute difference between the two predictions
+    """
+    import lightgbm as lgb
+
+    booster = lgb.Booster(model_file=str(model_path))
+    compiled = CompiledModel.from_file(model_path)
+    X = X[booster.feature_name()]
+
+    max_diff = np.max(np.abs(compiled.predict(X) - booster.predict(X)))
+    rows = []
+    for name, data in [('single_row', X.iloc[:1]), ('batch', X)]:
+        rows.append({
+            'call': name,
+            'rows': len(data),
+            'booster_ms': _latency(booster.predict, data, repeats),
+            'compiled_ms': _latency(compiled.predict, data, repeats),
+        })
+    results = pd.DataFrame(rows)
+    results['speedup'] = results['booster_ms'] / results['compiled_ms']
+    results['max_abs_diff'] = max_diff
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark the compiled tree ensemble")
+    parser.add_argument("--export-dir", default=str(BACKEND_EXPORT_DIR))
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    export_dir = Path(args.export_dir)
+    df_features = pd.read_pickle(export_dir / "features_weekly.pkl")
+    # All-cells batch: the last week of the panel, one row per cell
+    X_last = df_features[df_features['week_start'] == df_features['week_start'].max()]
+    print(benchmark(export_dir / "lgb_model.txt", X_last, args.repeats).to_string(index=False))
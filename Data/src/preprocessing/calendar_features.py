@@ -0,0 +1,89 @@
+"""
+Calendar and cyclic features from small lookup tables.
+
+Calendar parts (year, month, ISO week, ...) are computed once per distinct
+day and each sin/cos pair once per distinct value of its source column, then
+broadcast to every row with integer indexing. The functions return only the
+new columns (dicts of arrays), which callers write into their own frame, so
+no full-frame copy is made. The records, the daily Poisson panel, the weekly
+panels and the future weeks of the forecast all get their features from
+these functions.
+"""
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+# Cyclic encodings: column prefix -> (source column, period)
+CYCLES = {
+    'dow': ('day_of_week', 7),
+    'month': ('month', 12),
+    'doy': ('day_of_year', 365),
+    'hour': ('hour', 24),
+    'week': ('week_of_year', 52.0),
+}
+
+CALENDAR_PARTS = ['year', 'month', 'day', 'day_of_week', 'day_of_year', 'week_of_year', 'quarter']
+
+
+def _lookup(values) -> tuple:
+    """Integer codes of values and their distinct values (NaN included as a value)."""
+    return pd.factorize(np.asarray(values), use_na_sentinel=False)
+
+
+def cyclic_columns(df: Mapping) -> dict:
+    """
+    sin/cos columns of every CYCLES source present in df (DataFrame or dict
+    of arrays), e.g. 'month' -> 'month_sin', 'month_cos'.
+    """
+    columns = {}
+    for prefix, (source, period) in CYCLES.items():
+        if source not in df:
+            continue
+        codes, values = _lookup(pd.Series(df[source]).to_numpy(dtype=float, na_value=np.nan))
+        angle = 2 * np.pi * values / period
+        columns[f'{prefix}_sin'] = np.sin(angle)[codes]
+        columns[f'{prefix}_cos'] = np.cos(angle)[codes]
+    return columns
+
+
+def calendar_columns(dates: pd.Series, parts: list = CALENDAR_PARTS) -> dict:
+    """Calendar parts of each date (CALENDAR_PARTS: year, month, ..., ISO week_of_year)."""
+    codes, days = _lookup(pd.to_datetime(dates).to_numpy().astype('datetime64[D]'))
+    days = pd.DatetimeIndex(days)
+    table = {
+        'year': days.year,
+        'month': days.month,
+        'day': days.day,
+        'day_of_week': days.dayofweek,
+        'day_of_year': days.dayofyear,
+        'week_of_year': days.isocalendar()['week'],
+        'quarter': days.quarter,
+    }
+    # take() keeps the dtypes of the .dt accessors (e.g. UInt32 ISO week)
+    return {part: pd.Series(table[part]).array.take(codes) for part in parts}
+
+
+def date_flags(dates: pd.Series, flagged) -> np.ndarray:
+    """1 where the date (day) is in `flagged` (e.g. a holidays calendar), else 0."""
+    codes, days = _lookup(pd.to_datetime(dates).to_numpy().astype('datetime64[D]'))
+    table = np.array([1 if d in flagged else 0 for d in pd.DatetimeIndex(days).date], dtype=int)
+    return table[codes]
+
+
+def week_calendar(week_starts) -> dict:
+    """
+    Calendar features of weeks given by their start (Monday), as the weekly
+    panel has them for weeks without accidents: year and month of the week
+    start, ISO week, holiday 0, and their cyclic encodings.
+    """
+    week_starts = pd.DatetimeIndex(week_starts)
+    columns = {
+        'year': np.asarray(week_starts.year),
+        'week_of_year': np.asarray(week_starts.isocalendar()['week'], dtype=np.int64),
+        'month': np.asarray(week_starts.month),
+        'holiday': np.zeros(len(week_starts), dtype=int),
+        'weekend': (np.asarray(week_starts.dayofweek) >= 5).astype(int),
+    }
+    columns.update(cyclic_columns(columns))
+    return columns
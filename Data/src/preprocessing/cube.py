@@ -0,0 +1,497 @@
+"""
+Accident aggregate cube: counts, vehicles and victims per H3 cell, day and bairro.
+
+    python -m src.preprocessing.cube [--dataset processed/processed_dataset.csv]
+
+The processed records are aggregated once into a base table at day
+granularity, keyed by integer codes: cell (position in `cells`), day (days
+since 1970-01-01) and bairro (position in `bairros`, -1 when missing). Every
+coarser view is a reduction of that table instead of another pass over the
+records: rollup() gives week / month / year totals by cell, bairro or H3
+parent, weekly_panel() the weekly grid of aggregate_weekly_by_h3,
+monthly_heatmap() the export heatmap and the Poisson baseline reads its
+daily counts from it.
+
+Besides the additive measures, every base row keeps the max of the holiday
+and weekend flags and the attributes of its first record (as a groupby
+'first' would), which is what weekly_panel needs to match the record-level
+aggregation exactly.
+
+sync_cube keeps the cube saved at AGGREGATE_CUBE_PATH in step with the
+processed dataset: records appended since the last sync are aggregated and
+merged in; if any column the cube stores changed in earlier records, the
+cube is rebuilt.
+"""
+import argparse
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+import h3
+import numpy as np
+import pandas as pd
+
+from src.config.config import (
+    PROCESSED_DATASET_PATH,
+    AGGREGATE_CUBE_PATH,
+    PANDEMIC_YEARS,
+    VEHICLE_COLUMNS,
+    VICTIM_COLUMNS
+)
+
+CUBE_FORMAT_VERSION = 1
+KEYS = ['cell', 'day', 'bairro']
+FLAG_COLUMNS = ['holiday', 'weekend']
+FIRST_COLUMNS = ['month', 'year', 'latitude', 'longitude', 'bairro_encoded']
+CYCLIC_COLUMNS = ['month_sin', 'month_cos', 'dow_sin', 'dow_cos', 'doy_sin', 'doy_cos']
+TIME_GRAINS = ('day', 'week', 'month', 'year')
+
+
+def _fingerprint(df: pd.DataFrame, columns: list) -> str:
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def _days(dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def _mode(frame: pd.DataFrame, keys: list, value: str = 'bairro') -> pd.Series:
+    """
+    Most frequent value code of each group (ties to the smallest code, missing
+    values ignored), weighted by accident counts: safe_mode over the records.
+    """
+    counts = (
+        frame[frame[value] >= 0]
+        .groupby(keys + [value], sort=False)['num_sinistros'].sum()
+        .reset_index()
+        .sort_values(keys + ['num_sinistros', value], ascending=[True] * len(keys) + [False, True])
+    )
+    return counts.drop_duplicates(keys).set_index(keys)[value]
+
+
+class AggregateCube:
+    """
+    Base table (one row per cell, day and bairro with accidents) and the
+    dimension values its integer codes refer to.
+    """
+
+    def __init__(self, base: pd.DataFrame, cells: np.ndarray, bairros: np.ndarray, columns: dict,
+                 rows_seen: int, fingerprint: str):
+        self.base = base
+        self.cells = cells
+        self.bairros = bairros
+        self.columns = columns
+        self.rows_seen = rows_seen
+        self.fingerprint = fingerprint
+
+    @property
+    def measures(self) -> list:
+        return self.columns['measures']
+
+    @property
+    def first_columns(self) -> list:
+        return self.columns['first']
+
+    @property
+    def source_columns(self) -> list:
+        """Record columns the cube is built from (what its fingerprint covers)."""
+        columns = self.columns
+        bairro = [columns['bairro']] if columns['bairro'] else []
+        return [columns['date'], columns['h3']] + bairro + columns['measures'] + FLAG_COLUMNS + columns['first']
+
+    @staticmethod
+    def _columns(df: pd.DataFrame, h3_column: str, date_column: str, bairro_column: Optional[str],
+                 measures: Optional[list]) -> dict:
+        measures = [c for c in (measures if measures is not None else VEHICLE_COLUMNS + VICTIM_COLUMNS) if c in df]
+        return {
+            'h3': h3_column,
+            'date': date_column,
+            'bairro': bairro_column,
+            'measures': measures,
+            'first': FIRST_COLUMNS + [c for c in CYCLIC_COLUMNS if c in df]
+        }
+
+    @classmethod
+    def build(
+        cls,
+        df: pd.DataFrame,
+        h3_column: str = 'h3_cell',
+        date_column: str = 'Data',
+        bairro_column: Optional[str] = None,
+        measures: Optional[list] = None,
+        row_offset: int = 0
+    ) -> "AggregateCube":
+        """
+        Aggregate processed records (rows without an H3 cell are skipped).
+        bairro_column is the categorical dimension (e.g. 'bairro_clean'), None
+        for none. row_offset is the position of df's first row in the whole
+        dataset.
+        """
+        columns = cls._columns(df, h3_column, date_column, bairro_column, measures)
+        measures = columns['measures']
+
+        has_cell = df[h3_column].notna().to_numpy()
+        records = df[has_cell]
+        cell_codes, cells = pd.factorize(records[h3_column], sort=True)
+        if bairro_column:
+            bairro_codes, bairros = pd.factorize(records[bairro_column], sort=True)
+        else:
+            bairro_codes, bairros = np.full(len(records), -1), pd.Index([])
+
+        frame = pd.DataFrame({
+            'cell': cell_codes.astype(np.int32),
+            'day': _days(records[date_column]).astype(np.int32),
+            'bairro': bairro_codes.astype(np.int32),
+            'num_sinistros': np.ones(len(records), dtype=np.int64),
+            **{c: records[c].to_numpy() for c in measures + FLAG_COLUMNS + columns['first']},
+            'latitude_sum': records['latitude'].fillna(0).to_numpy(),
+            'longitude_sum': records['longitude'].fillna(0).to_numpy(),
+            'coord_count': records['latitude'].notna().to_numpy(dtype=np.int64),
+            'first_row': np.flatnonzero(has_cell) + row_offset
+        })
+
+        cube = cls(frame, np.asarray(cells, dtype=object), np.asarray(bairros, dtype=object), columns,
+                   row_offset + len(df), '')
+        cube.base = cube._reduce(frame, KEYS)
+        return cube
+
+    def _reduce(self, frame: pd.DataFrame, keys: list) -> pd.DataFrame:
+        """Group frame by keys: measures summed, flags maxed, first-record attributes kept."""
+        sum_cols = ['num_sinistros'] + self.measures + ['latitude_sum', 'longitude_sum', 'coord_count']
+        first_cols = self.first_columns + ['first_row']
+        grouped = frame.sort_values('first_row', kind='stable').groupby(keys, sort=True)
+        out = grouped[sum_cols].sum()
+        out[FLAG_COLUMNS] = grouped[FLAG_COLUMNS].max()
+        out[first_cols] = grouped[first_cols].first()
+        return out.reset_index()
+
+    def append(self, df_new: pd.DataFrame) -> "AggregateCube":
+        """Cube of the current records plus df_new (records appended to the dataset after them)."""
+        columns = self.columns
+        new = AggregateCube.build(df_new, columns['h3'], columns['date'], columns['bairro'],
+                                  columns['measures'], row_offset=self.rows_seen)
+
+        cells = np.union1d(self.cells, new.cells).astype(object)
+        bairros = np.union1d(self.bairros, new.bairros).astype(object)
+        parts = []
+        for part in (self, new):
+            base = part.base.copy()
+            base['cell'] = np.searchsorted(cells, part.cells)[base['cell']].astype(np.int32)
+            bairro_map = np.append(np.searchsorted(bairros, part.bairros), -1)
+            base['bairro'] = bairro_map[base['bairro']].astype(np.int32)
+            parts.append(base)
+
+        cube = AggregateCube(pd.DataFrame(), cells, bairros, columns, new.rows_seen, '')
+        cube.base = cube._reduce(pd.concat(parts, ignore_index=True), KEYS)
+        return cube
+
+    def save(self, path: Path = AGGREGATE_CUBE_PATH) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        pd.to_pickle({
+            'format_version': CUBE_FORMAT_VERSION,
+            'base': self.base,
+            'cells': self.cells,
+            'bairros': self.bairros,
+            'columns': self.columns,
+            'rows_seen': self.rows_seen,
+            'fingerprint': self.fingerprint
+        }, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path = AGGREGATE_CUBE_PATH) -> Optional["AggregateCube"]:
+        """Saved cube, or None if there is none or it has another format version."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        saved = pd.read_pickle(path)
+        if saved.get('format_version') != CUBE_FORMAT_VERSION:
+            return None
+        return cls(saved['base'], saved['cells'], saved['bairros'], saved['columns'],
+                   saved['rows_seen'], saved['fingerprint'])
+
+    def _select(self, pandemic_years: Optional[list] = None, since=None) -> pd.DataFrame:
+        base = self.base
+        if pandemic_years:
+            years = base['day'].to_numpy().astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+            base = base[~np.isin(years, pandemic_years)]
+        if since is not None:
+            base = base[base['day'] >= _days(pd.Series([since]))[0]]
+        return base
+
+    @staticmethod
+    def _period_start(days: np.ndarray, grain: str) -> np.ndarray:
+        days = np.asarray(days, dtype=np.int64)
+        if grain == 'day':
+            return days.astype('datetime64[D]')
+        if grain == 'week':
+            # 1970-01-01 was a Thursday: (day + 3) % 7 is the weekday, Monday = 0
+            return (days - (days + 3) % 7).astype('datetime64[D]')
+        unit = 'M' if grain == 'month' else 'Y'
+        return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype('datetime64[D]')
+
+    def rollup(
+        self,
+        time_grain: Optional[str] = 'week',
+        space: Union[str, int, None] = 'cell',
+        pandemic_years: Optional[list] = None,
+        since=None
+    ) -> pd.DataFrame:
+        """
+        Accident, vehicle and victim totals per time period and area.
+
+        Args:
+            time_grain: 'day', 'week' (starting Monday), 'month', 'year' or
+                None (whole period)
+            space: 'cell', 'bairro', an H3 resolution (parent cells) or None
+                (whole city)
+            pandemic_years: Years left out
+            since: First date included
+
+        Returns:
+            DataFrame with period_start and/or the area column (h3_cell,
+            bairro_clean or h3_parent), num_sinistros and the measures, one
+            row per non-empty group, sorted by area and period
+        """
+        if time_grain is not None and time_grain not in TIME_GRAINS:
+            raise ValueError(f"Unknown time grain: {time_grain}")
+
+        base = self._select(pandemic_years, since)
+        keys = {}
+        if space == 'cell':
+            keys['h3_cell'] = self.cells[base['cell'].to_numpy()]
+        elif space == 'bairro':
+            keys['bairro_clean'] = np.append(self.bairros, None)[base['bairro'].to_numpy()]
+        elif isinstance(space, int):
+            parents = np.array([h3.cell_to_parent(c, space) for c in self.cells], dtype=object)
+            keys['h3_parent'] = parents[base['cell'].to_numpy()]
+        elif space is not None:
+            raise ValueError(f"Unknown space: {space}")
+        if time_grain is not None:
+            keys['period_start'] = pd.to_datetime(self._period_start(base['day'], time_grain))
+
+        values = base[['num_sinistros'] + self.measures].reset_index(drop=True)
+        if not keys:
+            return values.sum().to_frame().T
+        frame = pd.concat([pd.DataFrame(keys), values], axis=1)
+        return frame.groupby(list(keys), sort=True, dropna=False).sum().reset_index()
+
+    def cell_bairro(self, pandemic_years: Optional[list] = None) -> pd.Series:
+        """Bairro of each cell's first record (None when missing), indexed by cell."""
+        base = self._select(pandemic_years)
+        first = base.sort_values('first_row', kind='stable').drop_duplicates('cell')
+        return pd.Series(
+            np.append(self.bairros, None)[first['bairro'].to_numpy()],
+            index=self.cells[first['cell'].to_numpy()]
+        )
+
+    def weekly_panel(self, pandemic_years: Optional[list] = None, since=None) -> pd.DataFrame:
+        """
+        Complete cell x week panel, identical to aggregate_weekly_by_h3 over the
+        same records (since: only the records from that date on).
+        """
+        h3_column, bairro_column = self.columns['h3'], self.columns['bairro']
+        base = self._select(pandemic_years, since)
+        print(f"\nRecords with H3: {int(base['num_sinistros'].sum()):,}")
+        if len(base) == 0:
+            raise ValueError("No valid H3 cells found in the dataset.")
+
+        base = base.assign(week=base['day'] - (base['day'] + 3) % 7)
+        weekly = self._reduce(base, ['cell', 'week'])
+        # Week keys as built from the records (ISO year-week, Monday start), once per distinct week
+        weeks, week_idx = np.unique(weekly['week'].to_numpy(), return_inverse=True)
+        starts = pd.Series(pd.to_datetime(weeks.astype('datetime64[D]'))).dt.to_period('W').apply(lambda r: r.start_time)
+        iso = starts.dt.isocalendar()
+        year_week = iso.year * 100 + iso.week
+
+        df_sinistros = pd.DataFrame({
+            h3_column: self.cells[weekly['cell'].to_numpy()],
+            'year_week': year_week.iloc[week_idx].reset_index(drop=True),
+            'week_start': starts.iloc[week_idx].reset_index(drop=True),
+            'num_sinistros': weekly['num_sinistros'].to_numpy(),
+            **{c: weekly[c].to_numpy() for c in FLAG_COLUMNS + self.first_columns + self.measures}
+        })
+        if bairro_column:
+            mode = _mode(base, ['cell', 'week']).reindex(pd.MultiIndex.from_frame(weekly[['cell', 'week']]))
+            df_sinistros[bairro_column] = self._bairro_names(mode)
+        print(f"\n Weeks with accidents: {len(df_sinistros):,} records")
+
+        # Cells in order of their first record, as Series.unique() on the records
+        first_rows = base.groupby('cell')['first_row'].min().sort_values()
+        unique_cells = self.cells[first_rows.index.to_numpy()]
+        unique_weeks = df_sinistros[['year_week', 'week_start']].drop_duplicates().sort_values('year_week')
+
+        by_cell = base.groupby('cell', sort=True)
+        cell_metadata = pd.DataFrame({
+            h3_column: self.cells[by_cell.size().index.to_numpy()],
+            'latitude': (by_cell['latitude_sum'].sum() / by_cell['coord_count'].sum()).to_numpy(),
+            'longitude': (by_cell['longitude_sum'].sum() / by_cell['coord_count'].sum()).to_numpy()
+        })
+        if bairro_column:
+            mode = _mode(base, ['cell']).reindex(by_cell.size().index)
+            cell_metadata[bairro_column] = self._bairro_names(mode)
+
+        return _complete_grid(
+            df_sinistros, unique_cells, unique_weeks, cell_metadata, h3_column,
+            self.measures, [bairro_column] if bairro_column else []
+        )
+
+    def categorical_modes(self, df: pd.DataFrame, columns: list, panel: pd.DataFrame,
+                          pandemic_years: Optional[list] = None) -> dict:
+        """
+        Most frequent value of further categorical columns of df (the records
+        the cube was built from) for every row of panel (its weekly_panel):
+        per cell and week, else per cell, as the bairro column gets. The
+        records of all columns are counted in a single groupby instead of a
+        cube per column.
+
+        Returns:
+            Dict of column -> values aligned with panel's rows
+        """
+        if not columns:
+            return {}
+        h3_column, date_column = self.columns['h3'], self.columns['date']
+        records = df[df[h3_column].notna()]
+        days = _days(records[date_column])
+        keep = np.ones(len(records), dtype=bool)
+        if pandemic_years:
+            years = days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+            keep = ~np.isin(years, pandemic_years)
+        cell = np.searchsorted(self.cells, records[h3_column].to_numpy())[keep]
+        week = (days - (days + 3) % 7)[keep]
+
+        values, parts = [], []
+        for i, col in enumerate(columns):
+            codes, uniques = pd.factorize(records[col].to_numpy()[keep], sort=True)
+            values.append(np.append(np.asarray(uniques, dtype=object), np.nan))
+            parts.append(pd.DataFrame({'column': i, 'cell': cell, 'week': week, 'code': codes}))
+        counts = (
+            pd.concat(parts, ignore_index=True)
+            .groupby(['column', 'cell', 'week', 'code'], sort=False).size()
+            .rename('num_sinistros').reset_index()
+        )
+        by_week = _mode(counts, ['column', 'cell', 'week'], 'code')
+        by_cell = _mode(counts, ['column', 'cell'], 'code')
+
+        panel_cell = np.searchsorted(self.cells, panel[h3_column].to_numpy())
+        panel_week = _days(panel['week_start'])
+        modes = {}
+        for i, col in enumerate(columns):
+            column = np.full(len(panel), i)
+            week_code = by_week.reindex(pd.MultiIndex.from_arrays([column, panel_cell, panel_week])).to_numpy()
+            cell_code = by_cell.reindex(pd.MultiIndex.from_arrays([column, panel_cell])).to_numpy()
+            code = pd.Series(week_code).fillna(pd.Series(cell_code))
+            modes[col] = values[i][code.fillna(-1).to_numpy(dtype=np.int64)]
+        return modes
+
+    def _bairro_names(self, codes: pd.Series) -> np.ndarray:
+        names = np.append(self.bairros, np.nan).astype(object)
+        return names[codes.fillna(-1).to_numpy(dtype=np.int64)]
+
+    def monthly_heatmap(self, pandemic_years: Optional[list] = None) -> pd.DataFrame:
+        """
+        The export heatmap (accidents per cell and month of the week start),
+        computed like the export does, from the weekly panel.
+        """
+        # utils imports this module
+        from src.utils import monthly_heatmap
+        return monthly_heatmap(self.weekly_panel(pandemic_years), self.columns['h3'])
+
+
+def _complete_grid(
+    df_sinistros: pd.DataFrame,
+    unique_cells: np.ndarray,
+    unique_weeks: pd.DataFrame,
+    cell_metadata: pd.DataFrame,
+    h3_column: str,
+    sum_columns: list,
+    categorical_columns: list
+) -> pd.DataFrame:
+    """All cells x all weeks, zero-filled, with cell-level metadata for the empty weeks."""
+    print(f"\n Building complete grid:")
+    print(f"  - Unique H3 cells: {len(unique_cells)}")
+    print(f"  - Unique weeks: {len(unique_weeks)}")
+
+    complete_grid = pd.merge(
+        pd.DataFrame({h3_column: unique_cells}),
+        unique_weeks,
+        how='cross'
+    )
+    print(f"  - Total combinations: {len(complete_grid):,}")
+
+    # Merge real data into the full grid
+    df_agg = complete_grid.merge(
+        df_sinistros,
+        on=[h3_column, 'year_week', 'week_start'],
+        how='left'
+    )
+
+    df_agg['num_sinistros'] = df_agg['num_sinistros'].fillna(0)
+
+    # Reconstruct year/month from week_start where missing
+    df_agg['year'] = df_agg['year'].fillna(df_agg['week_start'].dt.year)
+    df_agg['month'] = df_agg['month'].fillna(df_agg['week_start'].dt.month)
+    df_agg['week_of_year'] = df_agg['week_start'].dt.isocalendar().week
+
+    # Fill spatial and categorical metadata using cell-level statistics
+    df_agg = df_agg.merge(cell_metadata, on=h3_column, how='left', suffixes=('', '_celula'))
+
+    df_agg['latitude'] = df_agg['latitude'].fillna(df_agg['latitude_celula'])
+    df_agg['longitude'] = df_agg['longitude'].fillna(df_agg['longitude_celula'])
+    for col in categorical_columns:
+        if col in df_agg.columns:
+            df_agg[col] = df_agg[col].fillna(df_agg[f"{col}_celula"])
+
+    df_agg.drop(columns=[c for c in df_agg.columns if '_celula' in c], inplace=True)
+
+    fill_zero_cols = sum_columns + ['holiday', 'weekend']
+    for col in fill_zero_cols:
+        if col in df_agg.columns:
+            df_agg[col] = df_agg[col].fillna(0)
+
+    print(f"\nAggregation complete. Total records: {len(df_agg):,}")
+    return df_agg
+
+
+def sync_cube(df: pd.DataFrame, path: Path = AGGREGATE_CUBE_PATH) -> AggregateCube:
+    """
+    The saved cube brought up to date with df (the whole processed dataset),
+    aggregating only the records appended since it was saved.
+    """
+    start = time.perf_counter()
+    cube = AggregateCube.load(path)
+    bairro_column = 'bairro_clean' if 'bairro_clean' in df else None
+    columns = AggregateCube._columns(df, 'h3_cell', 'Data', bairro_column, None)
+
+    # Reused only if built from the same columns and none of them changed in the records it saw
+    if cube is not None and cube.columns == columns and cube.rows_seen <= len(df) and \
+            cube.fingerprint == _fingerprint(df.iloc[:cube.rows_seen], cube.source_columns):
+        if cube.rows_seen == len(df):
+            print(f"  - Aggregate cube up to date ({len(cube.base):,} cell-days)")
+            return cube
+        n_new = len(df) - cube.rows_seen
+        cube = cube.append(df.iloc[cube.rows_seen:])
+        print(f"  - Aggregate cube: {n_new:,} new records merged", end="")
+    else:
+        cube = AggregateCube.build(df, columns['h3'], columns['date'], columns['bairro'], columns['measures'])
+        print(f"  - Aggregate cube built from {len(df):,} records", end="")
+
+    cube.fingerprint = _fingerprint(df, cube.source_columns)
+    cube.save(path)
+    print(f" ({len(cube.base):,} cell-days, {time.perf_counter() - start:.1f}s)")
+    return cube
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the aggregate cube of the processed dataset")
+    parser.add_argument("--dataset", default=str(PROCESSED_DATASET_PATH))
+    parser.add_argument("--cube", default=str(AGGREGATE_CUBE_PATH))
+    args = parser.parse_args()
+
+    cube = sync_cube(pd.read_csv(args.dataset, low_memory=False), Path(args.cube))
+    print(cube.rollup('year', None, PANDEMIC_YEARS).to_string(index=False))
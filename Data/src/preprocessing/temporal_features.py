@@ -4,6 +4,29 @@ import holidays
 from datetime import date, timedelta
 from dateutil.easter import easter
 from src.utils import add_cyclic_features
+from src.preprocessing.calendar_features import calendar_columns, date_flags
+
+
+def build_holiday_calendar(years: list, municipal_holidays: dict) -> holidays.HolidayBase:
+    """
+    National, municipal and moveable (Carnaval, Good Friday) holidays of the given years.
+    """
+    br_holidays = holidays.Brazil(years=years)
+    
+    # Municipal holidays
+    for year in years:
+        for name, (month, day) in municipal_holidays.items():
+            br_holidays[date(year, month, day)] = name
+    
+    # Moveable holidays
+    for year in years:
+        easter_date = easter(year)
+        carnival = easter_date - timedelta(days=47)
+        good_friday = easter_date - timedelta(days=2)
+        br_holidays[carnival] = "Carnaval"
+        br_holidays[good_friday] = "Good Friday"
+    
+    return br_holidays
 
 
 def create_temporal_features(
@@ -13,6 +36,9 @@ def create_temporal_features(
 ) -> pd.DataFrame:
     """
     Create all temporal features.
+
+    The columns are added to df in place (no copy of the records); calendar
+    parts and holidays are computed once per distinct day.
     
     Args:
         df: DataFrame with 'DATA' column
@@ -24,43 +50,27 @@ def create_temporal_features(
     """
     print("CREATING TEMPORAL FEATURES")
     
-    df = df.copy()
-    
     # Basic temporal components
-    df['year'] = df['Data'].dt.year
-    df['month'] = df['Data'].dt.month
-    df['day'] = df['Data'].dt.day
-    df['day_of_week'] = df['Data'].dt.dayofweek
-    df['day_of_year'] = df['Data'].dt.dayofyear
-    df['week_of_year'] = df['Data'].dt.isocalendar().week
-    df['quarter'] = df['Data'].dt.quarter
+    for name, values in calendar_columns(df['Data']).items():
+        df[name] = values
     
     # Cyclic features
-    df = add_cyclic_features(df)
+    add_cyclic_features(df, inplace=True)
     
     # Time periods
     df['weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
     
     for period_name, (start, end) in time_periods.items():
-        df[period_name] = ((df['hour'] >= start) & (df['hour'] <= end)).astype(int)
+        if start <= end:
+            df[period_name] = ((df['hour'] >= start) & (df['hour'] <= end)).astype(int)
+        else:
+            # Period wraps past midnight (e.g. night: 20h-6h)
+            df[period_name] = ((df['hour'] >= start) | (df['hour'] <= end)).astype(int)
     
     # Holidays
     years = sorted(df['year'].unique().astype(int))
-    br_holidays = holidays.Brazil(years=years)
-    
-    # Municipal holidays
-    for year in years:
-        for name, (month, day) in municipal_holidays.items():
-            br_holidays[date(year, month, day)] = name
-    
-    # Moveable holidays
-    for year in years:
-        easter_date = easter(year)
-        carnival = easter_date - timedelta(days=47)
-        good_friday = easter_date - timedelta(days=2)
-        br_holidays[carnival] = "Carnaval"
-        br_holidays[good_friday] = "Good Friday"
+    br_holidays = build_holiday_calendar(years, municipal_holidays)
     
-    df['holiday'] = df['Data'].apply(lambda x: 1 if x in br_holidays else 0)
+    df['holiday'] = date_flags(df['Data'], br_holidays)
     
     return df
\ No newline at end of file
@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import h3
+import numpy as np
+import pandas as pd
+
+from src.export.bundle import read_bundle, CURRENT_FILE
+
+INDEX_DIR = "query_index"
+INDEX_FORMAT_VERSION = 1
+GRID_SIZE = 64  # Buckets per axis of the lat/lon grid used for bounding-box queries
+CSV_FILES = ("h3_grid.csv", "predictions_weekly.csv", "heatmap_monthly.csv")
+
+
+def _csr(groups: np.ndarray, n_groups: int) -> tuple:
+    """Return (ptr, members): members[ptr[g]:ptr[g + 1]] are the positions in group g."""
+    members = np.argsort(groups, kind='stable').astype(np.int32)
+    ptr = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=n_groups), out=ptr[1:])
+    return ptr, members
+
+
+def _tables_from_bundle(bundle: dict) -> dict:
+    cells = bundle['cells']
+    return {
+        'h3': cells['h3'],
+        'latitude': cells['latitude'],
+        'longitude': cells['longitude'],
+        'bairro_code': cells['bairro_code'],
+        'bairros': [str(b) for b in cells['bairros']],
+        'pred_cell': bundle['predictions']['cell_id'],
+        'pred_week': bundle['predictions']['week_start'].astype('datetime64[D]'),
+        'pred_value': bundle['predictions']['predicted_accidents'],
+        'heat_cell': bundle['heatmap_monthly']['cell_id'],
+        'heat_month': (bundle['heatmap_monthly']['year'].astype(np.int64) - 1970) * 12
+                      + bundle['heatmap_monthly']['month'] - 1,
+        'heat_value': bundle['heatmap_monthly']['num_sinistros']
+    }
+
+
+def _tables_from_csv(export_dir: Path) -> dict:
+    grid = pd.read_csv(export_dir / "h3_grid.csv")
+    cells = grid.groupby('h3_cell', sort=True).agg(
+        latitude=('latitude', 'mean'),
+        longitude=('longitude', 'mean'),
+        bairro=('bairro_clean', 'first')
+    ).reset_index()
+    cell_ids = pd.Series(np.arange(len(cells), dtype=np.int32), index=cells['h3_cell'])
+    bairro_codes, bairros = pd.factorize(cells['bairro'].fillna(''))
+
+    pred = pd.read_csv(export_dir / "predictions_weekly.csv", parse_dates=['week_start'])
+    heat = pd.read_csv(export_dir / "heatmap_monthly.csv")
+    pred = pred[pred['h3_cell'].isin(cell_ids.index)]
+    heat = heat[heat['h3_cell'].isin(cell_ids.index)]
+
+    return {
+        'h3': np.array([h3.str_to_int(c) for c in cells['h3_cell']], dtype=np.uint64),
+        'latitude': cells['latitude'].to_numpy(),
+        'longitude': cells['longitude'].to_numpy(),
+        'bairro_code': bairro_codes.astype(np.int32),
+        'bairros': [str(b) for b in bairros],
+        'pred_cell': pred['h3_cell'].map(cell_ids).to_numpy(dtype=np.int32),
+        'pred_week': pred['week_start'].to_numpy().astype('datetime64[D]'),
+        'pred_value': pred['predicted_accidents'].to_numpy(dtype=np.float32),
+        'heat_cell': heat['h3_cell'].map(cell_ids).to_numpy(dtype=np.int32),
+        'heat_month': (heat['year'].to_numpy(dtype=np.int64) - 1970) * 12 + heat['month'].to_numpy() - 1,
+        'heat_value': heat['num_sinistros'].to_numpy()
+    }
+
+
+def build_index(tables: dict, index_dir: Path, source: str) -> None:
+    """
+    Write the query index of one export as .npy files (opened memory-mapped
+    by ExportIndex) plus an index.json with the small lookup tables.
+
+    The directory is built next to its final location and renamed into place,
+    so concurrent readers never open a half-written index.
+    """
+    n_cells = len(tables['h3'])
+    weeks = np.unique(tables['pred_week'])
+    months = np.unique(tables['heat_month'])
+    month_base = int(months[0]) if len(months) else 0
+    n_weeks = len(weeks)
+    n_months = int(months[-1]) - month_base + 1 if len(months) else 1
+
+    # Sorted (cell, week) and (cell, month) keys
+    pred_key = tables['pred_cell'].astype(np.int64) * n_weeks + np.searchsorted(weeks, tables['pred_week'])
+    pred_order = np.argsort(pred_key, kind='stable')
+    heat_key = tables['heat_cell'].astype(np.int64) * n_months + (tables['heat_month'] - month_base)
+    heat_order = np.argsort(heat_key, kind='stable')
+
+    # bairro -> cells
+    bairro_ptr, bairro_cells = _csr(tables['bairro_code'], len(tables['bairros']))
+
+    # Uniform lat/lon grid -> cells
+    lat, lon = tables['latitude'], tables['longitude']
+    extent = [float(np.nanmin(lat)), float(np.nanmax(lat)), float(np.nanmin(lon)), float(np.nanmax(lon))]
+    grid_ptr, grid_cells = _csr(_grid_bucket(lat, lon, extent), GRID_SIZE * GRID_SIZE)
+
+    arrays = {
+        'h3': tables['h3'],
+        'latitude': lat.astype(np.float64),
+        'longitude': lon.astype(np.float64),
+        'bairro_code': tables['bairro_code'],
+        'pred_key': pred_key[pred_order],
+        'pred_value': tables['pred_value'][pred_order].astype(np.float32),
+        'heat_key': heat_key[heat_order],
+        'heat_value': tables['heat_value'][heat_order].astype(np.float64),
+        'bairro_ptr': bairro_ptr,
+        'bairro_cells': bairro_cells,
+        'grid_ptr': grid_ptr,
+        'grid_cells': grid_cells
+    }
+    info = {
+        'format_version': INDEX_FORMAT_VERSION,
+        'source': source,
+        'n_cells': n_cells,
+        'weeks': [str(w) for w in weeks],
+        'month_base': month_base,
+        'n_months': n_months,
+        'bairros': tables['bairros'],
+        'grid_extent': extent
+    }
+
+    index_dir = Path(index_dir)
+    tmp_dir = index_dir.with_name(f".tmp-{index_dir.name}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(array))
+    with open(tmp_dir / "index.json", "w") as f:
+        json.dump(info, f)
+    try:
+        os.replace(tmp_dir, index_dir)
+    except OSError:
+        # Another process built the same index first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _grid_bucket(lat, lon, extent) -> np.ndarray:
+    lat_min, lat_max, lon_min, lon_max = extent
+    gy = ((np.asarray(lat) - lat_min) / max(lat_max - lat_min, 1e-12) * GRID_SIZE).astype(np.int64)
+    gx = ((np.asarray(lon) - lon_min) / max(lon_max - lon_min, 1e-12) * GRID_SIZE).astype(np.int64)
+    return np.clip(gy, 0, GRID_SIZE - 1) * GRID_SIZE + np.clip(gx, 0, GRID_SIZE - 1)
+
+
+def _source_signature(export_dir: Path) -> tuple:
+    """Identify the export to index: the CURRENT bundle if any, else the CSV files."""
+    current = export_dir / "bundles" / CURRENT_FILE
+    if current.exists():
+        return 'bundle', current.read_text().strip()
+    stats = [(export_dir / f).stat() for f in CSV_FILES]
+    digest = hashlib.sha1(repr([(s.st_size, s.st_mtime_ns) for s in stats]).encode()).hexdigest()[:16]
+    return 'csv', digest
+
+
+class ExportIndex:
+    """
+    Read-only query index over a backend export.
+
+    Arrays are memory-mapped from the index directory, so opening an index is
+    cheap and several processes share the same pages. Queries use:
+      - sorted (cell, week) keys for forecasts and (cell, month) keys for the
+        heatmap, searched with np.searchsorted
+      - a bairro -> cells map
+      - a uniform lat/lon grid -> cells map for bounding boxes
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / "index.json") as f:
+            info = json.load(f)
+        if info['format_version'] != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format: {info['format_version']}")
+
+        self.source = info['source']
+        self.weeks = np.array(info['weeks'], dtype='datetime64[D]')
+        self.month_base = info['month_base']
+        self.n_months = info['n_months']
+        self.bairros = info['bairros']
+        self.grid_extent = info['grid_extent']
+        self._bairro_ids = {b: i for i, b in enumerate(self.bairros)}
+        self._bairro_names = np.array(self.bairros, dtype=object)
+
+        for path in self.index_dir.glob("*.npy"):
+            setattr(self, path.stem, np.load(path, mmap_mode='r'))
+        self._h3_strings = np.array([h3.int_to_str(int(c)) for c in self.h3], dtype=object)
+        self._cell_ids = {c: i for i, c in enumerate(self._h3_strings)}
+
+    @classmethod
+    def load(cls, export_dir: Path) -> "ExportIndex":
+        """
+        Open the index of an export directory, building it on first use.
+        The CURRENT bundle is indexed when present, otherwise the CSV files.
+        """
+        export_dir = Path(export_dir)
+        kind, signature = _source_signature(export_dir)
+        index_dir = export_dir / INDEX_DIR / f"{kind}-{signature}"
+
+        if not (index_dir / "index.json").exists():
+            print(f"Building query index for {kind} export {signature}...")
+            if kind == 'bundle':
+                tables = _tables_from_bundle(read_bundle(export_dir / "bundles", signature))
+            else:
+                tables = _tables_from_csv(export_dir)
+            build_index(tables, index_dir, f"{kind}-{signature}")
+
+            for old in (export_dir / INDEX_DIR).iterdir():
+                if old.name != index_dir.name and not old.name.startswith('.'):
+                    shutil.rmtree(old, ignore_errors=True)
+
+        return cls(index_dir)
+
+    # Helpers
+    def _week_code(self, week) -> int:
+        if week is None:
+            return 0
+        code = int(np.searchsorted(self.weeks, np.datetime64(pd.Timestamp(week).date(), 'D')))
+        if code >= len(self.weeks) or self.weeks[code] != np.datetime64(pd.Timestamp(week).date(), 'D'):
+            raise KeyError(f"No forecast for week {week}")
+        return code
+
+    def _month_code(self, month, default: int) -> int:
+        if month is None:
+            return default
+        ts = pd.Timestamp(month)
+        return (ts.year - 1970) * 12 + ts.month - 1 - self.month_base
+
+    def _cell_id(self, h3_cell: str) -> int:
+        if h3_cell not in self._cell_ids:
+            raise KeyError(f"Unknown H3 cell {h3_cell}")
+        return self._cell_ids[h3_cell]
+
+    def cells_in_bairro(self, bairro: str) -> np.ndarray:
+        if bairro not in self._bairro_ids:
+            raise KeyError(f"Unknown bairro {bairro}")
+        b = self._bairro_ids[bairro]
+        return np.asarray(self.bairro_cells[self.bairro_ptr[b]:self.bairro_ptr[b + 1]])
+
+    def cells_in_bbox(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> np.ndarray:
+        g_lat_min, g_lat_max, g_lon_min, g_lon_max = self.grid_extent
+        span_lat = max(g_lat_max - g_lat_min, 1e-12) / GRID_SIZE
+        span_lon = max(g_lon_max - g_lon_min, 1e-12) / GRID_SIZE
+        y0, y1 = np.clip([int((lat_min - g_lat_min) // span_lat), int((lat_max - g_lat_min) // span_lat)], 0, GRID_SIZE - 1)
+        x0, x1 = np.clip([int((lon_min - g_lon_min) // span_lon), int((lon_max - g_lon_min) // span_lon)], 0, GRID_SIZE - 1)
+
+        buckets = (np.arange(y0, y1 + 1)[:, None] * GRID_SIZE + np.arange(x0, x1 + 1)).ravel()
+        candidates = np.concatenate(
+            [self.grid_cells[self.grid_ptr[b]:self.grid_ptr[b + 1]] for b in buckets]
+        ) if len(buckets) else np.empty(0, dtype=np.int32)
+        lat, lon = self.latitude[candidates], self.longitude[candidates]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return np.sort(candidates[inside])
+
+    def _forecast(self, cells: np.ndarray, week_code: int) -> np.ndarray:
+        keys = cells.astype(np.int64) * len(self.weeks) + week_code
+        pos = np.searchsorted(self.pred_key, keys)
+        found = pos < len(self.pred_key)
+        found[found] = self.pred_key[pos[found]] == keys[found]
+        values = np.full(len(cells), np.nan, dtype=np.float32)
+        values[found] = self.pred_value[pos[found]]
+        return values
+
+    def _cells_frame(self, cells: np.ndarray, **columns) -> pd.DataFrame:
+        return pd.DataFrame({
+            'h3_cell': self._h3_strings[cells],
+            'latitude': self.latitude[cells],
+            'longitude': self.longitude[cells],
+            'bairro': self._bairro_names[self.bairro_code[cells]],
+            **columns
+        })
+
+    # Queries
+    def top_cells(self, k: int = 10, week=None, bairro: Optional[str] = None, bbox: Optional[tuple] = None) -> pd.DataFrame:
+        """
+        The k cells with the highest predicted accidents in a forecast week
+        (default: the first one), optionally restricted to a bairro and/or a
+        bounding box (lat_min, lon_min, lat_max, lon_max).
+        """
+        week_code = self._week_code(week)
+        cells = np.arange(len(self.h3), dtype=np.int32)
+        if bairro is not None:
+            cells = self.cells_in_bairro(bairro)
+        if bbox is not None:
+            cells = np.intersect1d(cells, self.cells_in_bbox(*bbox), assume_unique=True)
+
+        values = self._forecast(cells, week_code)
+        valid = ~np.isnan(values)
+        cells, values = cells[valid], values[valid]
+        if len(cells) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            cells, values = cells[top], values[top]
+        order = np.argsort(-values, kind='stable')
+
+        return self._cells_frame(cells[order], week_start=str(self.weeks[week_code]), predicted_accidents=values[order])
+
+    def cell_forecast(self, h3_cell: str) -> pd.DataFrame:
+        """All forecast weeks of one cell."""
+        cell = self._cell_id(h3_cell)
+        n_weeks = len(self.weeks)
+        lo, hi = np.searchsorted(self.pred_key, [cell * n_weeks, (cell + 1) * n_weeks])
+        week_codes = np.asarray(self.pred_key[lo:hi]) - cell * n_weeks
+        return pd.DataFrame({
+            'week_start': self.weeks[week_codes].astype(str),
+            'predicted_accidents': np.asarray(self.pred_value[lo:hi])
+        })
+
+    def heatmap_range(self, h3_cell: str, start=None, end=None) -> pd.DataFrame:
+        """Monthly historical counts of one cell between two months (inclusive)."""
+        cell = self._cell_id(h3_cell)
+        m0 = max(self._month_code(start, 0), 0)
+        m1 = min(self._month_code(end, self.n_months - 1), self.n_months - 1)
+        lo = np.searchsorted(self.heat_key, cell * self.n_months + m0, side='left')
+        hi = np.searchsorted(self.heat_key, cell * self.n_months + m1, side='right')
+        month_index = np.asarray(self.heat_key[lo:hi]) - cell * self.n_months + self.month_base
+        return pd.DataFrame({
+            'year': month_index // 12 + 1970,
+            'month': month_index % 12 + 1,
+            'num_sinistros': np.asarray(self.heat_value[lo:hi])
+        })
+
+    def heatmap_bbox(self, bbox: tuple, start=None, end=None) -> pd.DataFrame:
+        """
+        Monthly historical counts summed over the cells inside a bounding box
+        (lat_min, lon_min, lat_max, lon_max), between two months (inclusive).
+        """
+        cells = self.cells_in_bbox(*bbox).astype(np.int64)
+        m0 = max(self._month_code(start, 0), 0)
+        m1 = min(self._month_code(end, self.n_months - 1), self.n_months - 1)
+
+        lo = np.searchsorted(self.heat_key, cells * self.n_months + m0, side='left')
+        hi = np.searchsorted(self.heat_key, cells * self.n_months + m1, side='right')
+        # Empty when the month range is inverted or outside the data (m0 > m1)
+        lengths = np.maximum(hi - lo, 0)
+        # Positions of every (cell, month) entry in range, without a Python loop
+        positions = np.repeat(lo - np.cumsum(np.r_[0, lengths[:-1]]), lengths) + np.arange(lengths.sum())
+
+        months = (np.asarray(self.heat_key[positions]) % self.n_months) if len(positions) else np.empty(0, dtype=np.int64)
+        totals = np.bincount(months, weights=np.asarray(self.heat_value[positions]), minlength=self.n_months)
+        present = np.flatnonzero(np.bincount(months, minlength=self.n_months))
+        month_index = present + self.month_base
+        return pd.DataFrame({
+            'year': month_index // 12 + 1970,
+            'month': month_index % 12 + 1,
+            'num_sinistros': totals[present],
+            'cells': len(cells)
+        })
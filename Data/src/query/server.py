@@ -0,0 +1,131 @@
+"""
+Local HTTP facade over ExportIndex.
+
+    python -m src.query.server [--export-dir backend_export] [--port 8765]
+
+Endpoints (GET, JSON responses):
+    /health                          Index source and forecast weeks
+    /top?k=10&week=&bairro=&bbox=    Riskiest cells of a forecast week
+    /cells/<h3>/forecast             All forecast weeks of a cell
+    /cells/<h3>/heatmap?start=&end=  Monthly history of a cell (YYYY-MM)
+    /heatmap?bbox=&start=&end=       Monthly history summed inside a bounding box
+
+bbox is "lat_min,lon_min,lat_max,lon_max". When a new bundle becomes CURRENT
+the index is rebuilt and swapped in on the next request.
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from src.config.config import BACKEND_EXPORT_DIR
+from src.query.index import ExportIndex, _source_signature
+
+
+class IndexHolder:
+    """Keeps the index of the export currently published in export_dir."""
+
+    def __init__(self, export_dir: Path):
+        self.export_dir = Path(export_dir)
+        self._lock = threading.Lock()
+        self._signature = _source_signature(self.export_dir)
+        self._index = ExportIndex.load(self.export_dir)
+
+    def get(self) -> ExportIndex:
+        signature = _source_signature(self.export_dir)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._index = ExportIndex.load(self.export_dir)
+                    self._signature = signature
+        return self._index
+
+
+def _bbox(value: str) -> tuple:
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox must be lat_min,lon_min,lat_max,lon_max")
+    return tuple(parts)
+
+
+def make_handler(holder: IndexHolder):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload) -> None:
+            body = json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            parts = [p for p in url.path.split('/') if p]
+
+            try:
+                index = holder.get()
+            except Exception as e:
+                # The index of a newly published export failed to load
+                self._send(500, {'error': f"Index unavailable: {type(e).__name__}: {e}"})
+                return
+
+            try:
+                if parts == ['health']:
+                    result = {'source': index.source, 'weeks': [str(w) for w in index.weeks]}
+                elif parts == ['top']:
+                    result = index.top_cells(
+                        k=int(params.get('k', 10)),
+                        week=params.get('week'),
+                        bairro=params.get('bairro'),
+                        bbox=_bbox(params['bbox']) if 'bbox' in params else None
+                    ).to_dict('records')
+                elif len(parts) == 3 and parts[0] == 'cells' and parts[2] == 'forecast':
+                    result = index.cell_forecast(parts[1]).to_dict('records')
+                elif len(parts) == 3 and parts[0] == 'cells' and parts[2] == 'heatmap':
+                    result = index.heatmap_range(parts[1], params.get('start'), params.get('end')).to_dict('records')
+                elif parts == ['heatmap']:
+                    result = index.heatmap_bbox(_bbox(params['bbox']), params.get('start'), params.get('end')).to_dict('records')
+                else:
+                    self._send(404, {'error': f"Unknown endpoint {url.path}"})
+                    return
+            except KeyError as e:
+                self._send(404, {'error': str(e).strip("'")})
+                return
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                self._send(500, {'error': f"{type(e).__name__}: {e}"})
+                return
+
+            self._send(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return QueryHandler
+
+
+def serve(export_dir: Path = BACKEND_EXPORT_DIR, host: str = "127.0.0.1", port: int = 8765) -> None:
+    holder = IndexHolder(export_dir)
+    server = ThreadingHTTPServer((host, port), make_handler(holder))
+    print(f"Serving {holder.get().source} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query server over the backend export")
+    parser.add_argument("--export-dir", default=str(BACKEND_EXPORT_DIR))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve(Path(args.export_dir), args.host, args.port)
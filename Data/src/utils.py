@@ -3,6 +3,9 @@ import pandas as pd
 import numpy as np
 from typing import Optional, List
 
+from src.preprocessing.calendar_features import cyclic_columns
+from src.preprocessing.cube import AggregateCube
+
 def clean_address_part(x):
     if pd.isna(x):
         return ""
@@ -53,7 +56,12 @@ def aggregate_weekly_by_h3(
     victim_columns : list of str, optional
         Columns representing victim counts (e.g., ['vitimas', 'vitimasfatais']).
     categorical_columns : list of str, optional
-        Categorical columns to aggregate using mode (e.g., ['bairro_clean']).
+        Categorical columns to aggregate using mode (e.g., ['bairro_clean']);
+        columns missing from df are skipped.
+
+    The records are aggregated into an AggregateCube (one pass, at day level)
+    and the weekly grid is reduced from it; use AggregateCube.weekly_panel
+    directly to reuse a saved cube.
 
     Returns
     -------
@@ -62,28 +70,6 @@ def aggregate_weekly_by_h3(
     """
     
     print("WEEKLY AGGREGATION BY H3 CELL")
-    
-
-    df = df.copy()
-    df[date_column] = pd.to_datetime(df[date_column])
-
-    if pandemic_years:
-        print(f"\n[PRE-FILTER] Removing pandemic years: {pandemic_years}")
-        before = len(df)
-        df = df[~df[date_column].dt.year.isin(pandemic_years)]
-        print(f"  - Removed records: {before - len(df):,}")
-        print(f"  - Remaining records: {len(df):,}")
-
-    df_h3 = df[df[h3_column].notna()].copy()
-    print(f"\nRecords with H3: {len(df_h3):,}")
-
-    if len(df_h3) == 0:
-        raise ValueError("No valid H3 cells found in the dataset.")
-
-    # Add ISO year-week identifier and week start date
-    df_h3['year_week'] = df_h3[date_column].dt.isocalendar().year * 100 + \
-                         df_h3[date_column].dt.isocalendar().week
-    df_h3['week_start'] = df_h3[date_column].dt.to_period('W').apply(lambda r: r.start_time)
 
     if vehicle_columns is None:
         vehicle_columns = ['auto', 'moto', 'onibus', 'caminhao']
@@ -91,124 +77,196 @@ def aggregate_weekly_by_h3(
         victim_columns = ['vitimas', 'vitimasfatais']
     if categorical_columns is None:
         categorical_columns = ['bairro_clean']
+    categorical_columns = [c for c in categorical_columns if c in df.columns]
+
+    cube = AggregateCube.build(
+        df,
+        h3_column=h3_column,
+        date_column=date_column,
+        bairro_column=categorical_columns[0] if categorical_columns else None,
+        measures=vehicle_columns + victim_columns
+    )
+    if pandemic_years:
+        print(f"\n[PRE-FILTER] Removing pandemic years: {pandemic_years}")
+    df_agg = cube.weekly_panel(pandemic_years)
 
-    # Define aggregation rules
-    agg_dict = {
-        date_column: 'count',
-        'holiday': 'max',
-        'weekend': 'max',
-        'month': 'first',
-        'year': 'first',
-        'latitude': 'first',
-        'longitude': 'first',
-        'bairro_encoded': 'first'
-    }
-
-    # Add cyclic features if present
-    cyclic_cols = ['month_sin', 'month_cos', 'dow_sin', 'dow_cos', 'doy_sin', 'doy_cos']
-    for col in cyclic_cols:
-        if col in df_h3.columns:
-            agg_dict[col] = 'first'
-
-    # Add vehicle and victim columns (sum)
-    for col in vehicle_columns + victim_columns:
-        if col in df_h3.columns:
-            agg_dict[col] = 'sum'
-
-    # Add categorical columns (safe mode)
-    for col in categorical_columns:
-        if col in df_h3.columns:
-            agg_dict[col] = safe_mode
-
-    df_sinistros = df_h3.groupby([h3_column, 'year_week', 'week_start']).agg(agg_dict).reset_index()
-    df_sinistros.rename(columns={date_column: 'num_sinistros'}, inplace=True)
-
-    print(f"\n Weeks with accidents: {len(df_sinistros):,} records")
-
-    # Build complete grid: all cells × all weeks
-    unique_cells = df_h3[h3_column].unique()
-    unique_weeks = df_h3[['year_week', 'week_start']].drop_duplicates().sort_values('year_week')
+    # The cube has one categorical dimension: further columns get their modes
+    # from one count over the records
+    for col, values in cube.categorical_modes(df, categorical_columns[1:], df_agg, pandemic_years).items():
+        df_agg[col] = values
+    return df_agg
 
-    print(f"\n Building complete grid:")
-    print(f"  - Unique H3 cells: {len(unique_cells)}")
-    print(f"  - Unique weeks: {len(unique_weeks)}")
+def add_historical_features(df_weekly: pd.DataFrame, keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Adds lagged, rolling and cumulative accident counts per series.
 
-    complete_grid = pd.merge(
-        pd.DataFrame({h3_column: unique_cells}),
-        unique_weeks,
-        how='cross'
+    Series are identified by `keys` (default: ['h3_cell']; ['h3_cell', 'period']
+    for the time-of-day panel). Every feature only uses previous weeks.
+    """
+    keys = keys or ['h3_cell']
+    df = df_weekly.sort_values(keys + ['week_start']).copy()
+    df['week_start'] = pd.to_datetime(df['week_start'])
+    grouped = df.groupby(keys)
+
+    df['sinistros_lag_1w'] = grouped['num_sinistros'].shift(1)
+    df['sinistros_lag_4w'] = grouped['num_sinistros'].shift(4)
+    df['sinistros_mean_4w'] = grouped['num_sinistros'].transform(
+        lambda x: x.rolling(4, min_periods=1).mean().shift(1)
     )
-    print(f"  - Total combinations: {len(complete_grid):,}")
-
-    # Merge real data into the full grid
-    df_agg = complete_grid.merge(
-        df_sinistros,
-        on=[h3_column, 'year_week', 'week_start'],
-        how='left'
+    df['sinistros_mean_12w'] = grouped['num_sinistros'].transform(
+        lambda x: x.rolling(12, min_periods=1).mean().shift(1)
     )
+    # Totals of the series' previous weeks (cumsum excluding the current week)
+    df['total_historical_cell'] = grouped['num_sinistros'].cumsum() - df['num_sinistros']
+
+    for v in ['auto', 'moto', 'onibus', 'caminhao']:
+        if v in df.columns:
+            df[f'{v}_historical'] = grouped[v].cumsum() - df[v]
+
+    hist_cols = [
+        'sinistros_lag_1w', 'sinistros_lag_4w',
+        'sinistros_mean_4w', 'sinistros_mean_12w',
+        'total_historical_cell'
+    ] + [f'{v}_historical' for v in ['auto', 'moto', 'onibus', 'caminhao'] if f'{v}_historical' in df.columns]
+    df[hist_cols] = df[hist_cols].fillna(0)
+    return df
+
+def aggregate_weekly_by_h3_period(
+    df: pd.DataFrame,
+    period_columns: List[str],
+    h3_column: str = 'h3_cell',
+    date_column: str = 'Data',
+    pandemic_years: Optional[List[int]] = None
+) -> dict:
+    """
+    Count accidents per H3 cell, week and time-of-day period in a single pass.
+
+    Cells and weeks are integer-coded, every (record, period) flag set to 1
+    becomes one flat key cell * n_weeks * n_periods + week * n_periods + period,
+    and one bincount over those keys fills the dense 3-D panel. Periods may
+    overlap (e.g. 'morning_rush' and 'business_hours'), so a record can count
+    in several periods. Cells and weeks are the same as in aggregate_weekly_by_h3.
 
-    df_agg['num_sinistros'] = df_agg['num_sinistros'].fillna(0)
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Preprocessed DataFrame with the period flag columns from create_temporal_features.
+    period_columns : list of str
+        0/1 flag columns, one per period (e.g. list(TIME_PERIODS)).
+    h3_column : str, optional
+        Name of the H3 index column (default: 'h3_cell').
+    date_column : str, optional
+        Name of the date column (default: 'Data').
+    pandemic_years : list of int, optional
+        Years to exclude (e.g., [2020, 2021]).
 
-    # Reconstruct year/month from week_start where missing
-    df_agg['year'] = df_agg['year'].fillna(df_agg['week_start'].dt.year)
-    df_agg['month'] = df_agg['month'].fillna(df_agg['week_start'].dt.month)
-    df_agg['week_of_year'] = df_agg['week_start'].dt.isocalendar().week
+    Returns
+    -------
+    dict
+        'counts' (int32 array of shape cells × weeks × periods), 'cells',
+        'weeks' (sorted week starts) and 'periods'.
+    """
+    dates = pd.to_datetime(df[date_column])
+    mask = df[h3_column].notna().to_numpy()
+    if pandemic_years:
+        mask = mask & ~dates.dt.year.isin(pandemic_years).to_numpy()
+    if not mask.any():
+        raise ValueError("No valid H3 cells found in the dataset.")
 
-    # Fill spatial and categorical metadata using cell-level statistics
-    cell_metadata = df_h3.groupby(h3_column).agg({
-        'latitude': 'mean',
-        'longitude': 'mean'
-    }).reset_index()
+    cell_codes, cells = pd.factorize(df[h3_column].to_numpy()[mask])
+    week_starts = dates[mask].dt.to_period('W').dt.start_time
+    week_codes, weeks = pd.factorize(week_starts, sort=True)
+    flags = df.loc[mask, period_columns].fillna(0).to_numpy(dtype=bool)
 
-    for col in categorical_columns:
-        if col in df_h3.columns:
-            cell_metadata[col] = df_h3.groupby(h3_column)[col].apply(safe_mode).values
+    n_cells, n_weeks, n_periods = len(cells), len(weeks), len(period_columns)
+    print(f"  - Panel shape: {n_cells} cells × {n_weeks} weeks × {n_periods} periods")
 
-    df_agg = df_agg.merge(cell_metadata, on=h3_column, how='left', suffixes=('', '_celula'))
+    rows, period_codes = np.nonzero(flags)
+    keys = (cell_codes[rows].astype(np.int64) * n_weeks + week_codes[rows]) * n_periods + period_codes
+    counts = np.bincount(keys, minlength=n_cells * n_weeks * n_periods)
 
-    df_agg['latitude'] = df_agg['latitude'].fillna(df_agg['latitude_celula'])
-    df_agg['longitude'] = df_agg['longitude'].fillna(df_agg['longitude_celula'])
-    for col in categorical_columns:
-        if col in df_agg.columns:
-            df_agg[col] = df_agg[col].fillna(df_agg[f"{col}_celula"])
+    return {
+        'counts': counts.reshape(n_cells, n_weeks, n_periods).astype(np.int32),
+        'cells': np.asarray(cells),
+        'weeks': pd.DatetimeIndex(weeks),
+        'periods': list(period_columns)
+    }
 
-    df_agg.drop(columns=[c for c in df_agg.columns if '_celula' in c], inplace=True)
+def period_panel_to_frame(
+    panel: dict,
+    df_weekly: pd.DataFrame,
+    h3_column: str = 'h3_cell'
+) -> pd.DataFrame:
+    """
+    Expand the 3-D period panel to long format (one row per cell, week and
+    period), with 'num_sinistros' holding the period count and the cell/week
+    metadata of df_weekly (output of aggregate_weekly_by_h3) repeated per period.
 
-    fill_zero_cols = vehicle_columns + victim_columns + ['holiday', 'weekend']
-    for col in fill_zero_cols:
-        if col in df_agg.columns:
-            df_agg[col] = df_agg[col].fillna(0)
+    The frame has cells × weeks × periods rows, i.e. len(periods) times the
+    weekly panel.
+    """
+    counts = panel['counts']
+    n_cells, n_weeks, n_periods = counts.shape
+
+    df = pd.DataFrame({
+        h3_column: np.repeat(panel['cells'], n_weeks * n_periods),
+        'week_start': np.tile(np.repeat(panel['weeks'].to_numpy(), n_periods), n_cells),
+        'period': np.tile(np.array(panel['periods'], dtype=object), n_cells * n_weeks),
+        'period_code': np.tile(np.arange(n_periods), n_cells * n_weeks),
+        'num_sinistros': counts.ravel()
+    })
+
+    weekly_cols = [c for c in df_weekly.columns if c not in ('num_sinistros', 'period', 'period_code')]
+    return df.merge(df_weekly[weekly_cols], on=[h3_column, 'week_start'], how='left')
+
+def monthly_heatmap(
+    df_weekly: pd.DataFrame,
+    h3_column: str = 'h3_cell',
+    value_column: str = 'num_sinistros'
+) -> pd.DataFrame:
+    """
+    Sum weekly counts per H3 cell and calendar month of the week start.
 
-    print(f"\nAggregation complete. Total records: {len(df_agg):,}")
-    return df_agg
+    Uses integer cell/month codes and a single bincount instead of a
+    to_period('M') groupby, and leaves df_weekly untouched.
 
-def add_cyclic_features(df: pd.DataFrame) -> pd.DataFrame:
+    Returns
+    -------
+    pd.DataFrame
+        Columns h3_cell, num_sinistros, year, month, sorted by cell and month,
+        with one row per (cell, month) present in df_weekly.
+    """
+    cell_codes, cells = pd.factorize(df_weekly[h3_column], sort=True)
+    months = df_weekly['week_start'].to_numpy().astype('datetime64[M]').astype(np.int64)
+    month_codes, month_values = pd.factorize(months, sort=True)
+
+    n_months = len(month_values)
+    keys = cell_codes.astype(np.int64) * n_months + month_codes
+    size = len(cells) * n_months
+    totals = np.bincount(keys, weights=df_weekly[value_column].to_numpy(dtype=float), minlength=size)
+    present = np.flatnonzero(np.bincount(keys, minlength=size))
+
+    month_index = month_values[present % n_months]
+    return pd.DataFrame({
+        h3_column: np.asarray(cells)[present // n_months],
+        value_column: totals[present],
+        'year': month_index // 12 + 1970,
+        'month': month_index % 12 + 1
+    })
+
+def add_cyclic_features(df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
     """
     Adds sinusoidal and cosinoidal columns for cyclic time variables.
 
     Expects the DataFrame to have columns:
-    'day_of_week', 'month', 'day_of_year', 'hour' (optional)
-    """
-    df = df.copy()
-    
-    if 'day_of_week' in df:
-        df['dow_sin'] = np.sin(2 * np.pi * df['day_of_week'] / 7)
-        df['dow_cos'] = np.cos(2 * np.pi * df['day_of_week'] / 7)
-    
-    if 'month' in df:
-        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-    
-    if 'day_of_year' in df:
-        df['doy_sin'] = np.sin(2 * np.pi * df['day_of_year'] / 365)
-        df['doy_cos'] = np.cos(2 * np.pi * df['day_of_year'] / 365)
-    
-    if 'hour' in df:
-        df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-        df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+    'day_of_week', 'month', 'day_of_year', 'hour', 'week_of_year' (all optional)
 
-    if 'week_of_year' in df:
-        df['week_sin'] = np.sin(2 * np.pi * df['week_of_year'] / 52.0)
-        df['week_cos'] = np.cos(2 * np.pi * df['week_of_year'] / 52.0)
-    
+    Values come from per-value lookup tables (see cyclic_columns). With
+    inplace the columns are written into df; otherwise df is left untouched.
+    """
+    columns = cyclic_columns(df)
+    if not inplace:
+        return df.assign(**columns)
+    for name, values in columns.items():
+        df[name] = values
     return df
@@ -0,0 +1,34 @@
+import h3
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preprocessing.temporal_features import create_temporal_features
+from src.config.config import TIME_PERIODS, MUNICIPAL_HOLIDAYS
+
+
+def make_records(n_cells: int = 40, n_records: int = 3000, seed: int = 0) -> pd.DataFrame:
+    """Synthetic processed records around Recife, spread over several H3 res-7 regions."""
+    rng = np.random.default_rng(seed)
+    center = h3.latlng_to_cell(-8.05, -34.9, 9)
+    cells = sorted(h3.grid_disk(center, 30))[::25][:n_cells]
+    idx = rng.integers(0, len(cells), n_records)
+    latlng = np.array([h3.cell_to_latlng(c) for c in cells])
+
+    df = pd.DataFrame({
+        'Data': pd.Timestamp('2022-01-03') + pd.to_timedelta(rng.integers(0, 2 * 365, n_records), 'D'),
+        'hour': rng.integers(0, 24, n_records),
+        'h3_cell': np.array(cells)[idx],
+        'latitude': latlng[idx, 0],
+        'longitude': latlng[idx, 1],
+        'bairro_clean': [f"BAIRRO {i % 7}" for i in idx],
+        'bairro_encoded': idx % 7
+    })
+    for column in ['auto', 'moto', 'onibus', 'caminhao', 'vitimas', 'vitimasfatais']:
+        df[column] = rng.poisson(0.5, n_records)
+    return create_temporal_features(df, TIME_PERIODS, MUNICIPAL_HOLIDAYS)
+
+
+@pytest.fixture
+def records() -> pd.DataFrame:
+    return make_records()
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config.config import FEATURE_COLUMNS
+from src.modeling.backtest import run_backtest, select_cutoffs
+from src.utils import add_cyclic_features, add_historical_features, aggregate_weekly_by_h3
+
+
+def test_select_cutoffs_skips_horizons_across_removed_weeks():
+    # 2018-2019 and 2022 on, with the pandemic years removed in between
+    weeks = pd.date_range('2018-01-01', '2023-12-25', freq='W-MON')
+    weeks = weeks[(weeks.year < 2020) | (weeks.year > 2021)].to_numpy()
+    n_weeks, min_train_weeks = 4, 10
+
+    cutoffs = select_cutoffs(weeks, 1000, n_weeks, min_train_weeks)
+
+    valid = [
+        c for c in range(min_train_weeks, len(weeks) - n_weeks + 1)
+        if pd.Timestamp(weeks[c + n_weeks - 1]) - pd.Timestamp(weeks[c - 1]) == pd.Timedelta(weeks=n_weeks)
+    ]
+    assert cutoffs.tolist() == valid
+    gap = np.flatnonzero(np.diff(weeks) > np.timedelta64(7, 'D'))[0] + 1
+    assert not any(c <= gap < c + n_weeks for c in cutoffs)
+
+
+def test_select_cutoffs_spreads_picks():
+    weeks = pd.date_range('2022-01-03', periods=60, freq='W-MON').to_numpy()
+    cutoffs = select_cutoffs(weeks, 3, 4, 10)
+    assert cutoffs.tolist() == [10, 33, 56]
+
+
+def test_select_cutoffs_needs_enough_history():
+    weeks = pd.date_range('2022-01-03', periods=12, freq='W-MON').to_numpy()
+    with pytest.raises(ValueError, match="Not enough weeks"):
+        select_cutoffs(weeks, 2, 4, 10)
+
+
+def test_backtest_pools_cutoffs_by_horizon(records):
+    df_features = add_cyclic_features(add_historical_features(aggregate_weekly_by_h3(records)), inplace=True)
+    feature_cols = [c for c in FEATURE_COLUMNS if c in df_features.columns]
+
+    result = run_backtest(df_features, feature_cols, n_cutoffs=2, n_weeks=3, min_train_weeks=40, n_workers=1)
+    by_cutoff, by_horizon = result['by_cutoff'], result['by_horizon']
+
+    assert by_cutoff['cutoff'].nunique() == 2
+    assert by_horizon['horizon'].tolist() == [1, 2, 3]
+    assert by_horizon['n'].tolist() == by_cutoff.groupby('horizon')['n'].sum().tolist()
+    assert (by_horizon['cutoffs'] == 2).all()
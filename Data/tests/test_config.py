@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_env_overrides_only_touch_settings():
+    env = {**os.environ, 'VIASEGURA_os': '1', 'VIASEGURA_Path': 'x', 'VIASEGURA_PREDICTION_WEEKS': '3'}
+    result = subprocess.run(
+        [sys.executable, "-c", "from src.config import config; print(config.PREDICTION_WEEKS, config.os.__name__)"],
+        cwd=Path(__file__).resolve().parents[1], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['3', 'os']
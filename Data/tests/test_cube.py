@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from src.preprocessing.cube import AggregateCube, sync_cube
+from src.utils import aggregate_weekly_by_h3, monthly_heatmap, safe_mode
+
+PANDEMIC_YEARS = [2022]
+
+
+def test_monthly_heatmap_by_week_start(records):
+    df_weekly = aggregate_weekly_by_h3(records, pandemic_years=PANDEMIC_YEARS)
+    heatmap = AggregateCube.build(records).monthly_heatmap(PANDEMIC_YEARS)
+    pd.testing.assert_frame_equal(heatmap, monthly_heatmap(df_weekly))
+
+    # Same table as the groupby of the original export
+    df_weekly['year_month'] = df_weekly['week_start'].dt.to_period('M')
+    expected = df_weekly.groupby(['h3_cell', 'year_month'])['num_sinistros'].sum().reset_index()
+    assert heatmap['num_sinistros'].tolist() == expected['num_sinistros'].tolist()
+    assert heatmap['year'].tolist() == expected['year_month'].dt.year.tolist()
+    assert heatmap['month'].tolist() == expected['year_month'].dt.month.tolist()
+
+
+@pytest.mark.parametrize('column, value', [
+    ('moto', 9), ('vitimas', 9), ('bairro_clean', 'OUTRO BAIRRO'), ('holiday', 1), ('latitude', -8.0)
+])
+def test_sync_rebuilds_when_earlier_records_change(records, tmp_path, column, value):
+    path = tmp_path / "cube.pkl"
+    sync_cube(records.iloc[:2000], path)
+
+    edited = records.copy()
+    edited.loc[edited.index[10], column] = value
+    cube = sync_cube(edited, path)
+
+    expected = AggregateCube.build(edited, bairro_column='bairro_clean')
+    pd.testing.assert_frame_equal(cube.base, expected.base)
+    pd.testing.assert_frame_equal(cube.weekly_panel(), expected.weekly_panel())
+
+
+def test_sync_merges_appended_records(records, tmp_path):
+    path = tmp_path / "cube.pkl"
+    sync_cube(records.iloc[:2000], path)
+    cube = sync_cube(records, path)
+    pd.testing.assert_frame_equal(cube.weekly_panel(), aggregate_weekly_by_h3(records))
+
+
+def test_missing_categorical_columns_are_skipped(records):
+    df_weekly = aggregate_weekly_by_h3(records.drop(columns='bairro_clean'))
+    expected = aggregate_weekly_by_h3(records, categorical_columns=[])
+    pd.testing.assert_frame_equal(df_weekly, expected)
+
+
+def test_extra_categorical_columns_use_mode(records):
+    records['tipo'] = pd.Series(['COLISAO', 'ATROPELAMENTO', 'CHOQUE', None], dtype=object) \
+        .sample(len(records), replace=True, random_state=0).to_numpy()
+    df_weekly = aggregate_weekly_by_h3(records, categorical_columns=['bairro_clean', 'tipo', 'missing'])
+    pd.testing.assert_frame_equal(df_weekly.drop(columns='tipo'), aggregate_weekly_by_h3(records))
+
+    # safe_mode per cell and week, else per cell (as before the cube)
+    week_start = records['Data'].dt.to_period('W').dt.start_time
+    by_week = records.groupby(['h3_cell', week_start])['tipo'].agg(safe_mode)
+    by_cell = records.groupby('h3_cell')['tipo'].agg(safe_mode)
+    keys = pd.MultiIndex.from_frame(df_weekly[['h3_cell', 'week_start']])
+    expected = by_week.reindex(keys).to_numpy()
+    expected = pd.Series(expected).fillna(pd.Series(by_cell.reindex(df_weekly['h3_cell']).to_numpy()))
+    assert df_weekly['tipo'].tolist() == expected.tolist()
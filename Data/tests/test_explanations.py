@@ -0,0 +1,69 @@
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config.config import FEATURE_COLUMNS
+from src.export.explanations import CACHE_DIR, explain_forecast
+from src.modeling.forecast import iter_forecast_weeks
+from src.utils import add_cyclic_features, add_historical_features, aggregate_weekly_by_h3
+
+N_WEEKS = 2
+
+
+@pytest.fixture
+def df_features(records):
+    return add_cyclic_features(add_historical_features(aggregate_weekly_by_h3(records)), inplace=True)
+
+
+def _train(df_features: pd.DataFrame, path, seed: int = 0) -> list:
+    feature_cols = [c for c in FEATURE_COLUMNS if c in df_features.columns]
+    params = {'objective': 'poisson', 'num_leaves': 7, 'verbose': -1, 'seed': seed,
+              'bagging_fraction': 0.7, 'bagging_freq': 1, 'num_threads': 1}
+    data = lgb.Dataset(df_features[feature_cols], label=df_features['num_sinistros'])
+    lgb.train(params, data, num_boost_round=10).save_model(str(path))
+    return feature_cols
+
+
+def test_contributions_add_up_to_raw_score(df_features, tmp_path):
+    model_path = tmp_path / "lgb_model.txt"
+    feature_cols = _train(df_features, model_path)
+
+    result = explain_forecast(model_path, df_features, feature_cols, N_WEEKS, top_k=len(feature_cols))
+    explained = result['explanations'].groupby(['week_start', 'h3_cell'], sort=False)['contribution'].sum()
+
+    booster = lgb.Booster(model_file=str(model_path))
+    for week_start, units, X, _ in iter_forecast_weeks(booster, df_features, feature_cols, N_WEEKS):
+        total = explained.loc[week_start].reindex(units['h3_cell']).to_numpy() + result['base_value']
+        assert np.allclose(total, booster.predict(X, raw_score=True), atol=1e-4)
+
+
+def test_top_k_keeps_largest_contributions(df_features, tmp_path):
+    model_path = tmp_path / "lgb_model.txt"
+    feature_cols = _train(df_features, model_path)
+
+    explanations = explain_forecast(model_path, df_features, feature_cols, N_WEEKS, top_k=3)['explanations']
+    assert (explanations.groupby(['week_start', 'h3_cell']).size() == 3).all()
+    magnitude = explanations['contribution'].abs().to_numpy().reshape(-1, 3)
+    assert (np.diff(magnitude, axis=1) <= 0).all()
+
+
+def test_cache_is_per_model(df_features, tmp_path):
+    model_path = tmp_path / "lgb_model.txt"
+    feature_cols = _train(df_features, model_path)
+
+    first = explain_forecast(model_path, df_features, feature_cols, N_WEEKS)
+    cached = explain_forecast(model_path, df_features, feature_cols, N_WEEKS)
+    assert (first['weeks_cached'], cached['weeks_cached']) == (0, N_WEEKS)
+    pd.testing.assert_frame_equal(cached['explanations'], first['explanations'])
+    assert cached['base_value'] == first['base_value']
+    (first_cache,) = (tmp_path / CACHE_DIR).iterdir()
+
+    # Retrained in place: a miss, and the previous model's cache is pruned
+    _train(df_features, model_path, seed=1)
+    retrained = explain_forecast(model_path, df_features, feature_cols, N_WEEKS)
+    assert retrained['weeks_cached'] == 0
+    assert not retrained['explanations']['contribution'].equals(first['explanations']['contribution'])
+    (cache,) = (tmp_path / CACHE_DIR).iterdir()
+    assert cache != first_cache
+    assert len(list(cache.glob("*.npz"))) == N_WEEKS
@@ -0,0 +1,60 @@
+import json
+
+import lightgbm as lgb
+import pandas as pd
+import pytest
+
+from src.config.config import FEATURE_COLUMNS
+from src.modeling.incremental import extend_features, incremental_update
+from src.preprocessing.cube import AggregateCube
+from src.utils import add_cyclic_features, add_historical_features
+
+PANDEMIC_YEARS = [2020, 2021]
+CUTOFF = '2023-06-01'
+FEATURES = [
+    'num_sinistros', 'sinistros_lag_1w', 'sinistros_lag_4w', 'sinistros_mean_4w', 'sinistros_mean_12w',
+    'total_historical_cell', 'auto_historical', 'moto_historical', 'onibus_historical', 'caminhao_historical',
+    'month_sin', 'month_cos', 'week_sin', 'week_cos'
+]
+
+
+def _features(cube: AggregateCube, since=None) -> pd.DataFrame:
+    return add_cyclic_features(add_historical_features(cube.weekly_panel(PANDEMIC_YEARS, since)), inplace=True)
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(['h3_cell', 'week_start']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('bairro_column', ['bairro_clean', None])
+def test_extend_features_matches_full_recompute(records, bairro_column):
+    prev_cube = AggregateCube.build(records[records['Data'] < CUTOFF], bairro_column=bairro_column)
+    full_cube = AggregateCube.build(records, bairro_column=bairro_column)
+    df_prev = _features(prev_cube)
+
+    df_new = full_cube.weekly_panel(PANDEMIC_YEARS, since=df_prev['week_start'].max())
+    extended = _sorted(extend_features(df_prev, df_new))
+    expected = _sorted(_features(full_cube))
+
+    pd.testing.assert_frame_equal(extended[['h3_cell', 'week_start']], expected[['h3_cell', 'week_start']])
+    pd.testing.assert_frame_equal(extended[FEATURES], expected[FEATURES], check_dtype=False)
+
+
+def test_update_without_new_records_keeps_previous_run(records, tmp_path):
+    cube = AggregateCube.build(records, bairro_column='bairro_clean')
+    df_features = _features(cube)
+    feature_cols = [c for c in FEATURE_COLUMNS if c in df_features.columns]
+    model = lgb.train({'objective': 'poisson', 'verbose': -1, 'num_threads': 1},
+                      lgb.Dataset(df_features[feature_cols], label=df_features['num_sinistros']),
+                      num_boost_round=5)
+    model.save_model(tmp_path / "lgb_model.txt")
+    df_features.to_pickle(tmp_path / "features_weekly.pkl")
+    with open(tmp_path / "metadata.json", "w") as f:
+        json.dump({'cv_metrics': {'poisson_deviance': 1.0}}, f)
+
+    update = incremental_update(cube, tmp_path, {'objective': 'poisson', 'verbose': -1})
+
+    assert update is not None
+    assert update['model'].model_to_string() == model.model_to_string()
+    pd.testing.assert_frame_equal(update['features'], df_features)
+    assert update['feature_cols'] == feature_cols
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.modeling.lgb_model import sample_zero_rows
+
+N_STRATA = 3
+
+
+def _panel(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cells = np.repeat(np.arange(60), 50)
+    y = rng.poisson(np.repeat(rng.gamma(0.5, 0.4, 60), 50))
+    return y, cells
+
+
+@pytest.mark.parametrize('rate', [0.5, 0.1, 0.01])
+def test_zero_weights_sum_to_zero_count_per_stratum(rate):
+    y, cells = _panel()
+    idx, weights = sample_zero_rows(y, cells, rate, n_strata=N_STRATA)
+
+    # Strata as sample_zero_rows builds them
+    activity = np.bincount(cells, weights=y) / np.bincount(cells)
+    edges = np.unique(np.quantile(activity, np.linspace(0, 1, N_STRATA + 1)[1:-1]))
+    stratum = np.searchsorted(edges, activity, side='right')[cells]
+
+    assert np.array_equal(idx, np.unique(idx))
+    assert np.all(np.isin(np.flatnonzero(y > 0), idx))
+    assert np.all(weights[y[idx] > 0] == 1)
+    zero = y[idx] == 0
+    for s in np.unique(stratum):
+        in_stratum = stratum[idx] == s
+        assert weights[zero & in_stratum].sum() == pytest.approx(np.sum((y == 0) & (stratum == s)))
+        assert (zero & in_stratum).sum() < np.sum((y == 0) & (stratum == s))
+
+
+def test_rate_one_keeps_every_row():
+    y, cells = _panel()
+    idx, weights = sample_zero_rows(y, cells, 1)
+    assert np.array_equal(idx, np.arange(len(y)))
+    assert np.all(weights == 1)
+
+
+@pytest.mark.parametrize('rate', [1.5, 0, -0.1])
+def test_rate_out_of_range_raises(rate):
+    y, cells = _panel()
+    with pytest.raises(ValueError, match="rate"):
+        sample_zero_rows(y, cells, rate)
@@ -0,0 +1,98 @@
+import csv
+import io
+import os
+import uuid
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.export.postgres import TABLES, _copy_chunk, load_to_postgres
+
+# Parsing of a COPY ... (FORMAT CSV) field by column type
+CSV_TYPES = {
+    'text': str,
+    'bigint': int,
+    'integer': int,
+    'smallint': int,
+    'double precision': float,
+    'date': date.fromisoformat
+}
+
+
+class RecordingCopy:
+    """Stand-in for psycopg's Copy that keeps what would be sent."""
+
+    def __init__(self):
+        self.rows = []
+        self.text = ''
+
+    def write_row(self, row):
+        self.rows.append(row)
+
+    def write(self, data):
+        self.text += data
+
+
+def _sources():
+    cells = pd.DataFrame({
+        'h3_cell': ['89a8100c02bffff', '89a8100c02fffff'],
+        'latitude': [-8.05, np.nan],
+        'longitude': [-34.9, -34.88],
+        'bairro_clean': ['BOA VIAGEM', np.nan]
+    })
+    predictions = pd.DataFrame({
+        'h3_cell': ['89a8100c02bffff', '89a8100c02fffff'],
+        'week_start': ['2024-01-01', '2024-01-01'],
+        'predicted_accidents': [0.25, np.nan]
+    })
+    return {'cells': cells, 'predictions_weekly': predictions}
+
+
+def _copied_rows(table: str, chunk: pd.DataFrame, copy_format: str) -> list:
+    spec = TABLES[table]
+    columns = [name for name, _ in spec['columns']]
+    copy = RecordingCopy()
+    _copy_chunk(copy, spec['prepare'](chunk), columns, copy_format)
+    if copy_format == 'binary':
+        return copy.rows
+
+    # Unquoted empty fields are NULL in the CSV format
+    parsers = [CSV_TYPES[sql_type] for _, sql_type in spec['columns']]
+    return [
+        tuple(None if field == '' else parse(field) for parse, field in zip(parsers, record))
+        for record in csv.reader(io.StringIO(copy.text))
+    ]
+
+
+@pytest.mark.parametrize('table', ['cells', 'predictions_weekly'])
+def test_binary_and_csv_copy_send_same_rows(table):
+    chunk = _sources()[table]
+    binary = _copied_rows(table, chunk, 'binary')
+    text = _copied_rows(table, chunk, 'csv')
+
+    assert binary == text
+    assert any(None in row for row in binary)
+    assert not any(isinstance(v, float) and np.isnan(v) for row in binary for v in row)
+
+
+@pytest.mark.skipif(not os.environ.get('VIASEGURA_TEST_DSN'), reason="needs a Postgres DSN in VIASEGURA_TEST_DSN")
+def test_binary_and_csv_load_same_tables():
+    import psycopg
+
+    dsn = os.environ['VIASEGURA_TEST_DSN']
+    loaded = {}
+    for copy_format in ('csv', 'binary'):
+        schema = f"viasegura_test_{uuid.uuid4().hex[:8]}"
+        load_to_postgres(_sources(), dsn=dsn, schema=schema, copy_format=copy_format)
+        with psycopg.connect(dsn) as conn:
+            loaded[copy_format] = {
+                table: conn.execute(f'SELECT * FROM "{schema}"."{table}" ORDER BY h3_cell').fetchall()
+                for table in ('cells', 'predictions_weekly')
+            }
+            conn.execute(f'DROP SCHEMA "{schema}" CASCADE')
+
+    assert loaded['binary'] == loaded['csv']
@@ -0,0 +1,89 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import h3
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.query.index import ExportIndex
+from src.query.server import IndexHolder, make_handler
+
+MONTHS = pd.period_range('2023-01', '2023-06', freq='M')
+BBOX = (-90.0, -180.0, 90.0, 180.0)
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    center = h3.latlng_to_cell(-8.05, -34.9, 9)
+    cells = sorted(h3.grid_disk(center, 1))[:3]
+    latlng = np.array([h3.cell_to_latlng(c) for c in cells])
+    pd.DataFrame({
+        'h3_cell': cells, 'latitude': latlng[:, 0], 'longitude': latlng[:, 1], 'bairro_clean': ['A', 'A', 'B']
+    }).to_csv(tmp_path / "h3_grid.csv", index=False)
+    pd.DataFrame({
+        'h3_cell': np.repeat(cells, 2),
+        'week_start': np.tile(['2024-01-01', '2024-01-08'], 3),
+        'predicted_accidents': np.arange(6) / 10
+    }).to_csv(tmp_path / "predictions_weekly.csv", index=False)
+    pd.DataFrame({
+        'h3_cell': np.repeat(cells, len(MONTHS)),
+        'num_sinistros': np.arange(3 * len(MONTHS), dtype=float),
+        'year': np.tile(MONTHS.year, 3),
+        'month': np.tile(MONTHS.month, 3)
+    }).to_csv(tmp_path / "heatmap_monthly.csv", index=False)
+    return tmp_path
+
+
+def test_heatmap_bbox_sums_cells(export_dir):
+    index = ExportIndex.load(export_dir)
+    heat = index.heatmap_bbox(BBOX, '2023-02', '2023-03')
+    assert heat['month'].tolist() == [2, 3]
+    assert heat['num_sinistros'].tolist() == [1 + 7 + 13, 2 + 8 + 14]
+    assert len(index.heatmap_bbox(BBOX)) == len(MONTHS)
+
+
+@pytest.mark.parametrize('start, end', [('2030-01', None), ('2023-05', '2023-01'), (None, '2000-01')])
+def test_heatmap_queries_outside_the_data_are_empty(export_dir, start, end):
+    index = ExportIndex.load(export_dir)
+    cell = h3.int_to_str(int(index.h3[0]))
+    assert index.heatmap_bbox(BBOX, start, end).empty
+    assert index.heatmap_range(cell, start, end).empty
+
+
+def _get(server, path):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.fixture
+def server(export_dir):
+    holder = IndexHolder(export_dir)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(holder))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_answers_errors_as_json(server, export_dir, monkeypatch):
+    assert _get(server, "/heatmap?bbox=-90,-180,90,180&start=2030-01")[0] == 200
+    assert _get(server, "/cells/nope/forecast")[0] == 404
+    assert _get(server, "/heatmap?bbox=1,2")[0] == 400
+
+    monkeypatch.setattr(ExportIndex, 'heatmap_bbox', lambda *args: 1 / 0)
+    status, body = _get(server, "/heatmap?bbox=-90,-180,90,180")
+    assert status == 500 and 'ZeroDivisionError' in body['error']
+
+    # A newly published export whose index cannot be built
+    (export_dir / "heatmap_monthly.csv").write_text("h3_cell\n")
+    status, body = _get(server, "/health")
+    assert status == 500 and 'Index unavailable' in body['error']
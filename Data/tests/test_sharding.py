@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import lightgbm as lgb
+import pandas as pd
+import pytest
+
+from src.config.config import FEATURE_COLUMNS
+from src.modeling import sharding
+from src.modeling.forecast import generate_predictions
+from src.utils import add_cyclic_features, add_historical_features, aggregate_weekly_by_h3
+
+N_WEEKS = 2
+
+
+@pytest.fixture
+def df_weekly(records):
+    return aggregate_weekly_by_h3(records)
+
+
+def _train(df_features: pd.DataFrame, path, seed: int = 0, rounds: int = 10) -> list:
+    feature_cols = [c for c in FEATURE_COLUMNS if c in df_features.columns]
+    params = {'objective': 'poisson', 'num_leaves': 7, 'verbose': -1, 'seed': seed,
+              'bagging_fraction': 0.7, 'bagging_freq': 1, 'num_threads': 1}
+    data = lgb.Dataset(df_features[feature_cols], label=df_features['num_sinistros'])
+    lgb.train(params, data, num_boost_round=rounds).save_model(str(path))
+    return feature_cols
+
+
+def test_sharded_run_matches_unsharded(df_weekly, tmp_path):
+    shard_root = tmp_path / "shards"
+    df_features = add_cyclic_features(sharding.sharded_features(df_weekly, shard_root, n_workers=1), inplace=True)
+    expected = add_cyclic_features(add_historical_features(df_weekly), inplace=True)
+    assert len(sharding.plan_shards(df_weekly['h3_cell'].unique())) > 1
+    pd.testing.assert_frame_equal(df_features, expected)
+
+    model_path = tmp_path / "model.txt"
+    feature_cols = _train(df_features, model_path)
+    predictions = sharding.sharded_forecast(model_path, feature_cols, N_WEEKS, shard_root, n_workers=1)
+    expected = generate_predictions(lgb.Booster(model_file=str(model_path)), df_features, feature_cols, N_WEEKS)
+    pd.testing.assert_frame_equal(predictions, expected)
+
+
+def test_forecast_after_retrain_uses_new_model(df_weekly, tmp_path):
+    shard_root = tmp_path / "shards"
+    df_features = add_cyclic_features(sharding.sharded_features(df_weekly, shard_root, n_workers=1), inplace=True)
+    model_path = tmp_path / "model.txt"
+    feature_cols = _train(df_features, model_path)
+    first = sharding.sharded_forecast(model_path, feature_cols, N_WEEKS, shard_root, n_workers=1)
+
+    # Retrain in place, as `viasegura train` does, and forecast over the same shards
+    _train(df_features, model_path, seed=1, rounds=20)
+    second = sharding.sharded_forecast(model_path, feature_cols, N_WEEKS, shard_root, n_workers=1)
+    expected = generate_predictions(lgb.Booster(model_file=str(model_path)), df_features, feature_cols, N_WEEKS)
+
+    assert not first['predicted_accidents'].equals(second['predicted_accidents'])
+    pd.testing.assert_frame_equal(second, expected)
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_lock_of_dead_worker_is_reclaimed(df_weekly, tmp_path):
+    plan = sharding.partition(df_weekly, tmp_path)
+    parent = next(iter(plan))
+    (tmp_path / parent / "features.lock").write_text(f"{sharding.socket.gethostname()} {_dead_pid()}")
+
+    df_features = sharding._run_phase(tmp_path, 'features', n_workers=1, poll_seconds=0.01, timeout=5)
+    assert set(df_features['h3_cell']) == set(df_weekly['h3_cell'])
+
+
+def test_old_lock_is_reclaimed(df_weekly, tmp_path):
+    plan = sharding.partition(df_weekly, tmp_path)
+    lock = tmp_path / next(iter(plan)) / "features.lock"
+    lock.write_text("other-host 1")
+    os.utime(lock, (0, 0))
+
+    sharding._run_phase(tmp_path, 'features', n_workers=1, poll_seconds=0.01, timeout=5)
+
+
+def test_coordinator_times_out_on_live_lock(df_weekly, tmp_path):
+    plan = sharding.partition(df_weekly, tmp_path)
+    parent = next(iter(plan))
+    (tmp_path / parent / "features.lock").write_text(sharding._owner())
+
+    with pytest.raises(TimeoutError, match=parent):
+        sharding._run_phase(tmp_path, 'features', n_workers=1, poll_seconds=0.01, timeout=0.1)
@@ -0,0 +1,61 @@
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.modeling.tree_compiler import CompiledModel
+
+
+def _data(n: int = 2000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 6))
+    X[rng.random(X.shape) < 0.05] = 0.0
+    y = rng.poisson(np.exp(0.4 * X[:, 0] - 0.3 * X[:, 1] + 0.2 * np.abs(X[:, 2])))
+    # NaN rows only in some columns, so missing values get their own split directions
+    X[rng.random(n) < 0.1, 3] = np.nan
+    X[rng.random(n) < 0.1, 0] = np.nan
+    return X, y.astype(float)
+
+
+def _booster(objective: str, **params) -> tuple:
+    X, y = _data()
+    params = {'objective': objective, 'num_leaves': 15, 'min_data_in_leaf': 5, 'verbose': -1,
+              'num_threads': 1, **params}
+    booster = lgb.train(params, lgb.Dataset(X, label=y), num_boost_round=30)
+    X_test, _ = _data(500, seed=1)
+    X_test[:5] = np.nan
+    return booster, X_test
+
+
+@pytest.mark.parametrize('objective, params', [
+    ('poisson', {}),
+    ('regression', {}),
+    ('poisson', {'zero_as_missing': True}),
+    ('regression', {'zero_as_missing': True}),
+    ('poisson', {'use_missing': False}),
+])
+def test_compiled_predictions_match_booster(objective, params):
+    booster, X = _booster(objective, **params)
+    compiled = CompiledModel.from_booster(booster)
+
+    assert compiled.num_trees == booster.num_trees()
+    assert np.allclose(compiled.predict(X), booster.predict(X))
+    assert np.allclose(compiled.predict(X, raw_score=True), booster.predict(X, raw_score=True))
+    frame = pd.DataFrame(X, columns=booster.feature_name())
+    assert np.allclose(compiled.predict(frame), booster.predict(frame))
+
+
+def test_model_file_round_trip(tmp_path):
+    booster, X = _booster('poisson')
+    booster.save_model(tmp_path / "model.txt")
+    assert np.allclose(CompiledModel.from_file(tmp_path / "model.txt").predict(X), booster.predict(X))
+
+
+def test_categorical_splits_are_rejected():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'cat': pd.Categorical(rng.integers(0, 5, 1000)), 'x': rng.normal(size=1000)})
+    y = X['cat'].cat.codes.to_numpy() * 1.0 + rng.normal(size=1000)
+    booster = lgb.train({'objective': 'regression', 'verbose': -1, 'min_data_per_group': 5, 'cat_smooth': 1},
+                        lgb.Dataset(X, label=y), num_boost_round=5)
+    with pytest.raises(ValueError, match="Categorical"):
+        CompiledModel.from_booster(booster)
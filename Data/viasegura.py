@@ -0,0 +1,63 @@
+"""
+ViaSegura command-line interface.
+
+    python viasegura.py [--set NAME=VALUE ...] <command> [options]
+
+Commands run the pipeline one step at a time, passing artifacts through
+BACKEND_EXPORT_DIR (see src/commands/__init__.py):
+
+    prepare    raw dataset -> processed dataset (same as prepare_dataset.py)
+    aggregate  processed dataset -> features_weekly.pkl
+    train      features_weekly.pkl -> lgb_model.txt, training.json
+    forecast   model + features -> predictions_weekly.pkl
+    export     features + predictions -> backend files (EXPORT_FORMAT, Postgres)
+    bench      cold-start time of every command -> COLD_START_LOG
+
+Only this file and src.config are imported before the command is known; the
+command's module then imports what it needs (pandas, lightgbm, h3, ...).
+Settings of src/config/config.py are overridden with --set NAME=VALUE or
+VIASEGURA_NAME=VALUE in the environment.
+"""
+import argparse
+import importlib
+
+from src.config import config
+from src.commands import COMMANDS
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="viasegura", description="ViaSegura data & ML pipeline")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a setting of src/config/config.py (repeatable)")
+    # Used by `bench`: import the command's module and exit
+    parser.add_argument("--cold-start", action="store_true", help=argparse.SUPPRESS)
+
+    commands = parser.add_subparsers(dest="command", required=True, metavar="<command>")
+    subparsers = {name: commands.add_parser(name, help=help_text) for name, help_text in COMMANDS.items()}
+    subparsers['train'].add_argument("--baseline", action="store_true",
+                                     help="Also fit the Poisson baseline on the processed dataset")
+    subparsers['bench'].add_argument("--repeats", type=int, default=5)
+    return parser
+
+
+def main(argv=None) -> None:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Before the command's module reads the settings
+    for item in args.set:
+        name, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--set expects NAME=VALUE, got {item!r}")
+        try:
+            config.override(name, value)
+        except KeyError as e:
+            parser.error(e.args[0])
+
+    module = importlib.import_module(f"src.commands.{args.command}")
+    if not args.cold_start:
+        module.run(args)
+
+
+if __name__ == "__main__":
+    main()